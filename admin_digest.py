@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+
+from config_service import load_config
+from outbound import PRIORITY_NOTICE
+
+logger = logging.getLogger(__name__)
+
+# Modos de notificação do admin:
+#   immediate - uma mensagem por evento (comportamento antigo)
+#   digest    - eventos agrupados em um resumo periódico
+NOTIFICATION_MODES = ('immediate', 'digest')
+
+DEFAULT_INTERVAL_SECONDS = 60
+DEFAULT_MAX_EVENTS = 100
+# Vendas a partir deste valor (R$) são avisadas na hora mesmo no modo digest
+DEFAULT_IMMEDIATE_SALE_THRESHOLD = 100.0
+
+# Linhas de detalhe guardadas por tipo de evento em cada resumo
+MAX_DETAIL_LINES = 5
+
+
+class AdminDigest:
+    """Agrupa as notificações do admin (novos usuários, vendas, erros).
+
+    No modo digest os eventos são acumulados e enviados em um único resumo a
+    cada interval_seconds ou quando max_events eventos se acumulam. Vendas
+    acima do limite continuam sendo avisadas na hora.
+    """
+
+    def __init__(self, mode='digest', interval_seconds=DEFAULT_INTERVAL_SECONDS,
+                 max_events=DEFAULT_MAX_EVENTS, immediate_sale_threshold=DEFAULT_IMMEDIATE_SALE_THRESHOLD):
+        if mode not in NOTIFICATION_MODES:
+            raise ValueError(f"Modo de notificação inválido: {mode}")
+        self.mode = mode
+        self.interval = interval_seconds
+        self.max_events = max_events
+        self.immediate_sale_threshold = immediate_sale_threshold
+        self._bot = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._task = None
+        self._reset()
+
+    @classmethod
+    def from_config(cls, config):
+        settings = (config or {}).get('admin_notifications', {})
+        return cls(
+            mode=settings.get('mode', 'digest'),
+            interval_seconds=settings.get('interval_seconds', DEFAULT_INTERVAL_SECONDS),
+            max_events=settings.get('max_events', DEFAULT_MAX_EVENTS),
+            immediate_sale_threshold=settings.get('immediate_sale_threshold', DEFAULT_IMMEDIATE_SALE_THRESHOLD)
+        )
+
+    def _reset(self):
+        self._new_users = []
+        self._new_user_count = 0
+        self._sales = []
+        self._sale_count = 0
+        self._renewal_count = 0
+        self._revenue = 0.0
+        self._errors = []
+        self._error_count = 0
+
+    def _pending(self):
+        return self._new_user_count + self._sale_count + self._error_count
+
+    def attach(self, bot):
+        self._bot = bot
+
+    # Eventos
+
+    async def new_user(self, user_id, name, username, message):
+        """Novo usuário no bot; message é o aviso individual (modo immediate)"""
+        if self.mode == 'immediate':
+            await self._send(message)
+            return
+        self._new_user_count += 1
+        if len(self._new_users) < MAX_DETAIL_LINES:
+            self._new_users.append(f"{user_id} - {name}" + (f" (@{username})" if username else ""))
+        await self._after_event()
+
+    async def sale(self, user_id, plan, message, renewal=False):
+        """Assinatura nova ou renovada; vendas acima do limite saem na hora"""
+        price = float(plan['price'])
+        if self.mode == 'immediate' or price >= self.immediate_sale_threshold:
+            await self._send(message)
+            return
+        self._sale_count += 1
+        if renewal:
+            self._renewal_count += 1
+        self._revenue += price
+        if len(self._sales) < MAX_DETAIL_LINES:
+            self._sales.append(f"{'🔄' if renewal else '🎉'} {user_id} - {plan['name']} (R${price:.2f})")
+        await self._after_event()
+
+    async def error(self, message):
+        if self.mode == 'immediate':
+            await self._send(message)
+            return
+        self._error_count += 1
+        if len(self._errors) < MAX_DETAIL_LINES:
+            self._errors.append(message)
+        await self._after_event()
+
+    async def _after_event(self):
+        if self._task is None:
+            # Sem o envio periódico (fora do loop do bot), envia na hora
+            await self.flush()
+        elif self._pending() >= self.max_events:
+            self._wakeup.set()
+
+    # Resumo
+
+    def _summary_text(self):
+        lines = [f"📋 Resumo das notificações ({self._pending()} eventos)"]
+        if self._new_user_count:
+            lines.append(f"\n👤 Novos usuários: {self._new_user_count}")
+            lines.extend(self._new_users)
+            if self._new_user_count > len(self._new_users):
+                lines.append(f"... e mais {self._new_user_count - len(self._new_users)}")
+        if self._sale_count:
+            lines.append(f"\n💎 Vendas: {self._sale_count} ({self._renewal_count} renovações)")
+            lines.append(f"💰 Faturamento: R${self._revenue:.2f}")
+            lines.extend(self._sales)
+            if self._sale_count > len(self._sales):
+                lines.append(f"... e mais {self._sale_count - len(self._sales)}")
+        if self._error_count:
+            lines.append(f"\n⚠️ Erros: {self._error_count}")
+            lines.extend(self._errors)
+            if self._error_count > len(self._errors):
+                lines.append(f"... e mais {self._error_count - len(self._errors)}")
+        return "\n".join(lines)
+
+    async def flush(self):
+        """Envia o resumo dos eventos acumulados"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending():
+                return False
+            text = self._summary_text()
+            self._reset()
+            return await self._send(text)
+
+    async def _send(self, text):
+        if self._bot is None:
+            logger.warning("Notificação do admin descartada: bot não inicializado")
+            return False
+        try:
+            admin_id = load_config()['admin_id']
+            await self._bot.send_message(chat_id=admin_id, text=text, rate_limit_args=PRIORITY_NOTICE)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao notificar admin: {e}")
+            return False
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self, bot):
+        """Inicia o envio periódico (deve ser chamado dentro do loop do bot)"""
+        self.attach(bot)
+        if self.mode == 'immediate' or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"Resumo das notificações do admin ativo "
+            f"(intervalo {self.interval}s, máximo {self.max_events} eventos, "
+            f"vendas a partir de R${self.immediate_sale_threshold:.2f} na hora)"
+        )
+
+    async def close(self):
+        """Para o envio periódico e envia o que estiver pendente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Instância global das notificações do admin
+_admin_digest = None
+
+def get_admin_digest(config=None):
+    global _admin_digest
+    if _admin_digest is None:
+        _admin_digest = AdminDigest.from_config(config)
+    return _admin_digest
@@ -1,17 +1,37 @@
-import json
 import logging
 import os
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters, JobQueue
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ChatJoinRequestHandler, ChatMemberHandler, ContextTypes, MessageHandler, filters, JobQueue
 import qrcode
 from PIL import Image
 import io
-import mercadopago
 import asyncio
-import threading
 import time
 from threading import Thread
+from config_service import load_config, load_config_for_update, save_config
+from message_templates import load_messages
+from plan_catalog import get_plan_catalog
+from keyboards import other_plans_markup, payment_methods_markup, plans_markup
+from payment_watcher import get_payment_watcher
+from mercadopago_client import MercadoPagoError, get_mercadopago_client
+from payment_cache import get_payment_cache
+from fulfillment_ledger import CLAIMED, FULFILLED, get_fulfillment_ledger
+from broadcast import get_broadcast_engine
+from admin_digest import get_admin_digest
+from group_registry import get_group_registry, missing_rights
+from invite_pool import format_invite_failures, get_invite_pool, issue_invite_links
+from join_requests import get_access_mode, get_join_request_gate
+from membership import get_membership_index
+from outbound import PRIORITY_FULFILLMENT, PRIORITY_NOTICE, get_outbound_dispatcher
+from storage import get_storage
+from subscription_index import get_subscription_index
+from expiry_scheduler import RETRY_DELAY, get_expiry_scheduler
+from expiry_executor import get_expiry_executor
+from reminder_wheel import get_reminder_wheel
+import persistence
+from user_stats import get_user_stats_writer
+from persistence import save_config_async
 
 # Configuração de logging
 logging.basicConfig(
@@ -20,61 +40,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Lock para operações no JSON
-json_lock = threading.Lock()
-
 # Variável global para a instância do bot
 _bot_instance = None
 
+# Aplicação e loop de eventos do bot (definidos no post_init)
+_application = None
+_bot_loop = None
+
 def get_bot_instance():
     """Retorna a instância global do bot"""
-    global _bot_instance
+    # Depois da inicialização, o bot da aplicação passa pela fila de saída
+    if _application is not None:
+        return _application.bot
     return _bot_instance
 
-# Carregar configurações
-def load_config():
-    try:
-        with json_lock:
-            with open('config.json', 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                logger.info("Config carregada com sucesso")
-                # Verificar estrutura do config
-                if 'payment_methods' not in config:
-                    logger.error("Estrutura payment_methods não encontrada no config")
-                    return None
-                if 'pix_automatico' not in config['payment_methods']:
-                    logger.error("pix_automatico não encontrado no config")
-                    return None
-                if 'pix_manual' not in config['payment_methods']:
-                    logger.error("pix_manual não encontrado no config")
-                    return None
-                return config
-    except Exception as e:
-        logger.error(f"Erro ao carregar config.json: {e}")
-        return None
-
-# Salvar configurações
-def save_config(config):
-    try:
-        with json_lock:
-            # Primeiro salva em um arquivo temporário
-            temp_file = 'config.json.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
-            
-            # Se salvou com sucesso, renomeia para o arquivo original
-            os.replace(temp_file, 'config.json')
-            logger.info("Configuração salva com sucesso")
-            return True
-    except Exception as e:
-        logger.error(f"Erro ao salvar config.json: {e}")
-        return False
+def get_bot_loop():
+    """Retorna o loop de eventos do bot (None antes da inicialização)"""
+    return _bot_loop
 
 # Editar uma configuração específica
 def edit_config(key, value):
     try:
         logger.info(f"Iniciando edição de {key} com valor: {value}")
-        config = load_config()
+        config = load_config_for_update()
         if not config:
             logger.error("Não foi possível carregar o config.json")
             return False
@@ -109,29 +97,21 @@ def edit_config(key, value):
 # edit_config('payment_methods.pix_manual.chave_pix', 'Nova chave PIX')
 
 # Verificar pagamento no Mercado Pago
-def check_payment(payment_id):
-    config = load_config()
-    sdk = mercadopago.SDK(config['mercadopago']['access_token'])
-    
-    payment_response = sdk.payment().get(payment_id)
-    payment = payment_response["response"]
-    
-    return payment
+async def check_payment(payment_id):
+    try:
+        # Consultas simultâneas do mesmo pagamento compartilham a mesma requisição
+        return await get_payment_cache().get(payment_id)
+    except MercadoPagoError as e:
+        logger.error(f"Erro ao consultar pagamento {payment_id}: {e}")
+        return None
 
 # Registrar assinatura VIP
 async def register_vip_subscription(user_id, plan_id, payment_id, context):
     try:
-        # Carregar assinaturas existentes
-        try:
-            with json_lock:
-                with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                    subscriptions = json.load(f)
-        except FileNotFoundError:
-            subscriptions = []
-        
         # Encontrar o plano
         config = load_config()
-        plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+        plan_catalog = get_plan_catalog(config)
+        plan = plan_catalog.get(plan_id)
         if not plan:
             return False
         
@@ -144,7 +124,7 @@ async def register_vip_subscription(user_id, plan_id, payment_id, context):
             end_date = datetime.now() + timedelta(days=plan['duration_days'])
         
         # Adicionar nova assinatura
-        subscriptions.append({
+        subscription = await get_subscription_index().add({
             "user_id": user_id,
             "plan_id": plan_id,
             "end_date": end_date.strftime("%Y-%m-%d %H:%M:%S"),
@@ -153,18 +133,15 @@ async def register_vip_subscription(user_id, plan_id, payment_id, context):
             "payment_id": payment_id,
             "is_permanent": plan['duration_days'] == -1
         })
-        
-        # Salvar assinaturas
-        with json_lock:
-            with open('subscriptions.json', 'w', encoding='utf-8') as f:
-                json.dump(subscriptions, f, indent=4, ensure_ascii=False)
+        get_expiry_scheduler().arm()
+        get_reminder_wheel().schedule(subscription)
+        get_reminder_wheel().arm()
         
         logger.info(f"Nova assinatura registrada: usuário {user_id}, plano {plan_id}")
         logger.info(f"Data de expiração: {end_date}")
 
-        # Notificar admin
+        # Notificar admin (agrupado no resumo, exceto vendas acima do limite)
         try:
-            admin_id = config['admin_id']
             admin_message = (
                 f"🎉 Nova Assinatura VIP!\n\n"
                 f"👤 Usuário: {user_id}\n"
@@ -174,7 +151,7 @@ async def register_vip_subscription(user_id, plan_id, payment_id, context):
                 f"📅 Expira em: {end_date.strftime('%d/%m/%Y %H:%M')}\n"
                 f"💳 ID do Pagamento: {payment_id}"
             )
-            await context.bot.send_message(chat_id=admin_id, text=admin_message)
+            await get_admin_digest().sale(user_id, plan, admin_message)
         except Exception as e:
             logger.error(f"Erro ao notificar admin sobre nova assinatura: {e}")
 
@@ -186,27 +163,16 @@ async def register_vip_subscription(user_id, plan_id, payment_id, context):
 
 async def renew_vip_subscription(user_id, plan_id, payment_id, context):
     try:
-        # Carregar assinaturas existentes
-        try:
-            with json_lock:
-                with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                    subscriptions = json.load(f)
-        except FileNotFoundError:
-            subscriptions = []
-        
         # Encontrar o plano
         config = load_config()
-        plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+        plan_catalog = get_plan_catalog(config)
+        plan = plan_catalog.get(plan_id)
         if not plan:
             return False
         
         # Encontrar assinatura atual
-        current_subscription = next(
-            (sub for sub in subscriptions 
-             if sub['user_id'] == user_id 
-             and datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > datetime.now()),
-            None
-        )
+        subscription_index = get_subscription_index()
+        current_subscription = subscription_index.get_active(user_id)
         
         if not current_subscription:
             logger.error(f"Tentativa de renovação sem assinatura ativa: usuário {user_id}")
@@ -223,12 +189,8 @@ async def renew_vip_subscription(user_id, plan_id, payment_id, context):
             end_date = current_end_date + timedelta(days=plan['duration_days'])
             logger.info(f"Renovação detectada. Dias restantes: {days_left}, Novos dias: {plan['duration_days']}, Total: {days_left + plan['duration_days']}")
         
-        # Remover assinatura antiga
-        subscriptions = [sub for sub in subscriptions if sub != current_subscription]
-        logger.info(f"Assinatura antiga removida para usuário {user_id}")
-        
-        # Adicionar nova assinatura (sem notificações)
-        subscriptions.append({
+        # Substituir assinatura antiga pela nova (sem notificações)
+        subscription = await subscription_index.replace(current_subscription['id'], {
             "user_id": user_id,
             "plan_id": plan_id,
             "end_date": end_date.strftime("%Y-%m-%d %H:%M:%S"),
@@ -242,19 +204,19 @@ async def renew_vip_subscription(user_id, plan_id, payment_id, context):
             "notified_3": False,
             "renewal_notified": False
         })
-        
-        # Salvar assinaturas
-        with json_lock:
-            with open('subscriptions.json', 'w', encoding='utf-8') as f:
-                json.dump(subscriptions, f, indent=4, ensure_ascii=False)
+        get_expiry_scheduler().arm()
+        reminder_wheel = get_reminder_wheel()
+        reminder_wheel.cancel(current_subscription['id'])
+        reminder_wheel.schedule(subscription)
+        reminder_wheel.arm()
+        logger.info(f"Assinatura antiga substituída para usuário {user_id}")
         
         logger.info(f"Renovação registrada: usuário {user_id}, plano {plan_id}")
         logger.info(f"Nova data de expiração: {end_date}")
         logger.info(f"Notificações de expiração limpas para o usuário {user_id}")
 
-        # Notificar admin
+        # Notificar admin (agrupado no resumo, exceto vendas acima do limite)
         try:
-            admin_id = config['admin_id']
             admin_message = (
                 f"🔄 Renovação de Assinatura VIP!\n\n"
                 f"👤 Usuário: {user_id}\n"
@@ -264,7 +226,7 @@ async def renew_vip_subscription(user_id, plan_id, payment_id, context):
                 f"📅 Nova expiração: {end_date.strftime('%d/%m/%Y %H:%M')}\n"
                 f"💳 ID do Pagamento: {payment_id}"
             )
-            await context.bot.send_message(chat_id=admin_id, text=admin_message)
+            await get_admin_digest().sale(user_id, plan, admin_message, renewal=True)
         except Exception as e:
             logger.error(f"Erro ao notificar admin sobre renovação: {e}")
 
@@ -277,93 +239,46 @@ async def renew_vip_subscription(user_id, plan_id, payment_id, context):
 # Adicionar usuário aos grupos VIP
 async def add_user_to_vip_groups(bot, user_id, plan_id):
     config = load_config()
+    plan_catalog = get_plan_catalog(config)
     
     # Encontrar o plano
-    plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+    plan = plan_catalog.get(plan_id)
     if not plan:
         return False
     
-    # Adicionar usuário aos grupos
-    for group_id in plan['groups']:
+    if get_access_mode(config) == 'join_request':
+        # Links fixos de pedido de entrada: nenhuma chamada à API na compra
+        links, failures = get_join_request_gate().links_for(plan['groups'])
+        footer = "Toque no link e peça para entrar: o pedido é aprovado automaticamente enquanto sua assinatura estiver ativa."
+    else:
+        # Um link por grupo (sem repetir), obtidos em paralelo
+        links, failures = await issue_invite_links(bot, plan['groups'], user_id)
+        footer = "Os links expiram em 7 dias e só podem ser usados uma vez."
+    
+    # Uma única mensagem com todos os links
+    if links:
+        link_lines = "\n".join(f"{position}. {invite_link}" for position, invite_link in enumerate(links.values(), 1))
         try:
-            # Verificar se o grupo é um supergrupo
-            chat = await bot.get_chat(group_id)
-            if chat.type in ['group', 'supergroup']:
-                try:
-                    # Tentar criar link de convite
-                    invite_link = await bot.create_chat_invite_link(
-                        chat_id=group_id,
-                        name=f"VIP {user_id}",
-                        expire_date=datetime.now() + timedelta(days=7),
-                        member_limit=1,
-                        creates_join_request=False
-                    )
-                    
-                    # Enviar link para o usuário
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text=f"🎉 Use este link para entrar no grupo VIP:\n{invite_link.invite_link}\n\nO link expira em 7 dias e só pode ser usado uma vez."
-                    )
-                    logger.info(f"Link de convite enviado para usuário {user_id} - grupo {group_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao criar link de convite para grupo {group_id}: {e}")
-                    # Se falhar, tenta obter link existente
-                    try:
-                        invite_link = await bot.export_chat_invite_link(chat_id=group_id)
-                        await bot.send_message(
-                            chat_id=user_id,
-                            text=f"🎉 Use este link para entrar no grupo VIP:\n{invite_link}\n\nO link expira em 7 dias."
-                        )
-                        logger.info(f"Link existente enviado para usuário {user_id} - grupo {group_id}")
-                    except Exception as e2:
-                        logger.error(f"Erro ao obter link existente: {e2}")
-                        # Se tudo falhar, notifica o admin
-                        admin_id = config['admin_id']
-                        await bot.send_message(
-                            chat_id=admin_id,
-                            text=f"⚠️ Erro ao gerar link para usuário {user_id} no grupo {group_id}.\nErro: {e}\nErro do link: {e2}\n\nVerifique se o bot tem permissões de administrador no grupo."
-                        )
-            else:
-                logger.error(f"Grupo {group_id} não é um grupo ou supergrupo válido")
-                # Notifica o admin
-                admin_id = config['admin_id']
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=f"⚠️ Grupo {group_id} não é um grupo ou supergrupo válido.\nTipo: {chat.type}"
-                )
-                
-        except Exception as e:
-            logger.error(f"Erro ao processar grupo {group_id}: {e}")
-            # Notifica o admin
-            admin_id = config['admin_id']
             await bot.send_message(
-                chat_id=admin_id,
-                text=f"⚠️ Erro ao processar grupo {group_id} para usuário {user_id}.\nErro: {e}"
+                chat_id=user_id,
+                text=f"🎉 Use os links abaixo para entrar nos grupos VIP:\n\n{link_lines}\n\n{footer}",
+                rate_limit_args=PRIORITY_FULFILLMENT
             )
+            logger.info(f"{len(links)} links de convite enviados para usuário {user_id}")
+        except Exception as e:
+            logger.error(f"Erro ao enviar links de convite para usuário {user_id}: {e}")
+            failures['envio'] = e
+    
+    # Falhas de todos os grupos em um único alerta ao admin
+    if failures:
+        await get_admin_digest().error(format_invite_failures(failures, user_id))
     
     return True
 
 # Gerar QR Code PIX do Mercado Pago
-def generate_mercadopago_pix(amount, description, external_reference):
-    config = load_config()
-    sdk = mercadopago.SDK(config['mercadopago']['access_token'])
-    
-    payment_data = {
-        "transaction_amount": float(amount),
-        "description": description,
-        "payment_method_id": "pix",
-        "external_reference": external_reference,
-        "payer": {
-            "email": "cliente@email.com",
-            "first_name": "Cliente",
-            "last_name": "Teste"
-        }
-    }
-
+async def generate_mercadopago_pix(amount, description, external_reference):
     try:
-        payment_response = sdk.payment().create(payment_data)
-        payment = payment_response["response"]
+        payment = await get_mercadopago_client().create_pix_payment(amount, description, external_reference)
         
         # Verificar se tem os dados do PIX
         if "point_of_interaction" in payment and "transaction_data" in payment["point_of_interaction"]:
@@ -395,45 +310,20 @@ def generate_pix_qr_code(payment_data):
 # Adicionar usuário às estatísticas
 async def add_user_to_stats(user, bot):
     try:
-        # Carregar estatísticas atuais
-        try:
-            with json_lock:
-                with open('stats.json', 'r', encoding='utf-8') as f:
-                    stats = json.load(f)
-        except FileNotFoundError:
-            stats = {
-                "total_users": 0,
-                "users": [],
-                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-        
-        # Verificar se usuário já existe
-        user_exists = any(u['id'] == user.id for u in stats['users'])
-        
-        if not user_exists:
-            # Adicionar novo usuário
-            stats['users'].append({
-                "id": user.id,
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "joined_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "is_vip": False
-            })
-            stats['total_users'] = len(stats['users'])
-            stats['last_update'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Salvar estatísticas
-            with json_lock:
-                with open('stats.json', 'w', encoding='utf-8') as f:
-                    json.dump(stats, f, indent=4, ensure_ascii=False)
-            
+        # Usuários que retornam são reconhecidos pelo conjunto em memória
+        stats_writer = get_user_stats_writer()
+        if not stats_writer.is_known_user(user.id):
+            # Enfileirar novo usuário (gravado em lote)
+            await stats_writer.add_user(
+                user.id,
+                username=user.username,
+                first_name=user.first_name,
+                last_name=user.last_name
+            )
             logger.info(f"Novo usuário adicionado: {user.id}")
 
-            # Notificar admin sobre novo usuário
+            # Notificar admin sobre novo usuário (agrupado no resumo)
             try:
-                config = load_config()
-                admin_id = config['admin_id']
                 msg = (
                     f"👤 Novo usuário acessou o bot!\n\n"
                     f"ID: {user.id}\n"
@@ -441,7 +331,12 @@ async def add_user_to_stats(user, bot):
                     f"Username: @{user.username if user.username else '-'}\n"
                     f"Data de entrada: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
                 )
-                await bot.send_message(chat_id=admin_id, text=msg)
+                await get_admin_digest().new_user(
+                    user.id,
+                    f"{user.first_name or ''} {user.last_name or ''}".strip(),
+                    user.username,
+                    msg
+                )
             except Exception as e:
                 logger.error(f"Erro ao notificar admin sobre novo usuário: {e}")
         
@@ -451,21 +346,7 @@ async def add_user_to_stats(user, bot):
 # Atualizar status VIP do usuário
 async def update_user_vip_status(user_id, is_vip=True):
     try:
-        # Carregar estatísticas atuais
-        with json_lock:
-            with open('stats.json', 'r', encoding='utf-8') as f:
-                stats = json.load(f)
-        
-        # Encontrar e atualizar o usuário
-        for user in stats['users']:
-            if user['id'] == user_id:
-                user['is_vip'] = is_vip
-                break
-        
-        # Salvar estatísticas
-        with json_lock:
-            with open('stats.json', 'w', encoding='utf-8') as f:
-                json.dump(stats, f, indent=4, ensure_ascii=False)
+        await get_user_stats_writer().set_vip(user_id, is_vip)
         
         logger.info(f"Status VIP atualizado para usuário {user_id}: {is_vip}")
         return True
@@ -477,6 +358,7 @@ async def update_user_vip_status(user_id, is_vip=True):
 # Comandos do bot
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     config = load_config()
+    plan_catalog = get_plan_catalog(config)
     
     # Verifica modo manutenção
     if config.get('admin_settings', {}).get('maintenance_mode', False):
@@ -486,41 +368,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Adiciona usuário às estatísticas
     await add_user_to_stats(update.effective_user, context.bot)
     
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await update.message.reply_text("Erro ao carregar mensagens.")
         return
     
-    # Verificar assinaturas ativas do usuário
-    try:
-        with open('subscriptions.json', 'r', encoding='utf-8') as f:
-            subscriptions = json.load(f)
-    except FileNotFoundError:
-        subscriptions = []
-    
-    # Filtrar assinaturas ativas do usuário
-    active_subscriptions = [
-        sub for sub in subscriptions 
-        if sub['user_id'] == update.effective_user.id 
-        and datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > datetime.now()
-    ]
+    # Verificar assinatura ativa do usuário
+    active_subscription = get_subscription_index().get_active(update.effective_user.id)
     
     # Se tiver assinatura ativa, mostra status e planos disponíveis
-    if active_subscriptions:
+    if active_subscription:
         # Encontrar o plano atual
-        current_plan = next(
-            (p for p in config['vip_plans'] 
-             if p['id'] == active_subscriptions[0]['plan_id']),
-            None
-        )
+        current_plan = plan_catalog.get(active_subscription['plan_id'])
         
         if current_plan:
             # Calcular tempo restante
-            end_date = datetime.strptime(active_subscriptions[0]['end_date'], "%Y-%m-%d %H:%M:%S")
+            end_date = datetime.strptime(active_subscription['end_date'], "%Y-%m-%d %H:%M:%S")
             time_left = end_date - datetime.now()
             days_left = time_left.days
             hours_left = time_left.seconds // 3600
@@ -529,37 +393,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             is_expiring_soon = (
                 (days_left == 0 and hours_left <= 24) or
                 days_left in [1, 2, 3]
-            ) and not active_subscriptions[0].get('is_permanent', False)
-            
-            # Criar teclado
-            keyboard = []
-            
-            # Se estiver próximo de expirar, adicionar botão de renovação
-            if is_expiring_soon:
-                keyboard.append([InlineKeyboardButton(
-                    "🔄 Renovar Plano Atual",
-                    callback_data=f"renew_{current_plan['id']}"
-                )])
+            ) and not active_subscription.get('is_permanent', False)
             
-            # Adicionar outros planos disponíveis
-            available_plans = [
-                plan for plan in config['vip_plans']
-                if plan['id'] != current_plan['id']
-            ]
-            
-            for plan in available_plans:
-                keyboard.append([InlineKeyboardButton(
-                    f"💎 {plan['name']} - R${plan['price']:.2f}",
-                    callback_data=f"plan_{plan['id']}"
-                )])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            # Outros planos disponíveis e, se estiver próximo de expirar, o botão de renovação
+            reply_markup = other_plans_markup(current_plan['id'], renew=is_expiring_soon, config=config)
             
             # Mensagem de status
             status_message = f"✨ Você já é VIP!\n\n"
             status_message += f"Plano atual: {current_plan['name']}\n"
             
-            if active_subscriptions[0].get('is_permanent', False):
+            if active_subscription.get('is_permanent', False):
                 status_message += "Duração: Permanente\n\n"
             else:
                 if days_left == 0:
@@ -579,14 +422,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     
     # Se não tiver assinatura ativa, mostra todos os planos
-    keyboard = []
-    for plan in config['vip_plans']:
-        keyboard.append([InlineKeyboardButton(
-            f"💎 {plan['name']} - R${plan['price']:.2f}",
-            callback_data=f"plan_{plan['id']}"
-        )])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = plans_markup(config)
     await update.message.reply_text(
         messages.get('start_message', 'Escolha um dos planos VIP disponíveis:'),
         reply_markup=reply_markup
@@ -600,20 +436,8 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
     if query.data.startswith("renew_"):
         plan_id = int(query.data.split('_')[1])
         
-        # Carregar assinaturas ativas do usuário
-        try:
-            with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
-        except FileNotFoundError:
-            subscriptions = []
-        
         # Encontrar assinatura atual
-        current_subscription = next(
-            (sub for sub in subscriptions 
-             if sub['user_id'] == update.effective_user.id 
-             and datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > datetime.now()),
-            None
-        )
+        current_subscription = get_subscription_index().get_active(update.effective_user.id)
         
         if current_subscription:
             # Calcular dias restantes
@@ -628,8 +452,8 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             # Mensagem de confirmação
-            config = load_config()
-            plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+            plan_catalog = get_plan_catalog()
+            plan = plan_catalog.get(plan_id)
             if plan:
                 message = f"🔄 Confirmação de Renovação\n\n"
                 message += f"Plano: {plan['name']}\n"
@@ -649,33 +473,25 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
         plan_id = int(query.data.split('_')[1])
     
     config = load_config()
+    plan_catalog = get_plan_catalog(config)
     
     # Verifica modo manutenção
     if config.get('admin_settings', {}).get('maintenance_mode', False):
         await query.message.reply_text("🛠️ O bot está em manutenção. Tente novamente mais tarde.")
         return
     
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await query.message.reply_text("Erro ao carregar mensagens.")
         return
     
-    plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+    plan = plan_catalog.get(plan_id)
     if not plan:
         await query.message.reply_text("Plano não encontrado.")
         return
     
-    keyboard = []
-    if config['payment_methods']['pix_automatico']['enabled']:
-        keyboard.append([InlineKeyboardButton("💳 PIX Automático", callback_data=f"pix_auto_{plan_id}")])
-    if config['payment_methods']['pix_manual']['enabled']:
-        keyboard.append([InlineKeyboardButton("💳 PIX Manual", callback_data=f"pix_manual_{plan_id}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = payment_methods_markup(plan_id, config)
     
     # Mensagem personalizada para renovação
     if query.data.startswith("renew_"):
@@ -700,15 +516,7 @@ async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFA
     
     if query.data == "cancel_renew":
         # Voltar para o menu inicial
-        keyboard = []
-        config = load_config()
-        for plan in config['vip_plans']:
-            keyboard.append([InlineKeyboardButton(
-                f"💎 {plan['name']} - R${plan['price']:.2f}",
-                callback_data=f"plan_{plan['id']}"
-            )])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = plans_markup()
         await query.message.edit_text(
             "Escolha um dos planos VIP disponíveis:",
             reply_markup=reply_markup
@@ -720,25 +528,17 @@ async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFA
     
     # Mostrar opções de pagamento
     config = load_config()
-    plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+    plan_catalog = get_plan_catalog(config)
+    plan = plan_catalog.get(plan_id)
     if not plan:
         await query.message.reply_text("Plano não encontrado.")
         return
     
-    keyboard = []
-    if config['payment_methods']['pix_automatico']['enabled']:
-        keyboard.append([InlineKeyboardButton("💳 PIX Automático", callback_data=f"pix_auto_{plan_id}")])
-    if config['payment_methods']['pix_manual']['enabled']:
-        keyboard.append([InlineKeyboardButton("💳 PIX Manual", callback_data=f"pix_manual_{plan_id}")])
+    reply_markup = payment_methods_markup(plan_id, config)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await query.message.reply_text("Erro ao carregar mensagens.")
         return
     
@@ -758,6 +558,7 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     config = load_config()
+    plan_catalog = get_plan_catalog(config)
     
     # Verifica modo manutenção
     if config.get('admin_settings', {}).get('maintenance_mode', False):
@@ -769,23 +570,20 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
     method = parts[1]  # pix_auto ou pix_manual
     plan_id = parts[2]  # ID do plano
     
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await query.message.reply_text("Erro ao carregar mensagens.")
         return
     
-    plan = next((p for p in config['vip_plans'] if p['id'] == int(plan_id)), None)
+    plan = plan_catalog.get(plan_id)
     if not plan:
         await query.message.reply_text("Plano não encontrado.")
         return
     
     if method == "auto":
         # Gerar PIX do Mercado Pago
-        pix_data = generate_mercadopago_pix(
+        pix_data = await generate_mercadopago_pix(
             plan['price'],
             f"VIP {plan['name']} - {plan['duration_days']} dias",
             f"{update.effective_user.id}_{plan_id}"  # Referência externa
@@ -808,19 +606,13 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
                 reply_markup=reply_markup
             )
             
-            # Iniciar verificação automática
-            context.job_queue.run_repeating(
-                check_payment_auto,
-                interval=5,
-                first=5,
-                data={
-                    'message_id': message.message_id,
-                    'chat_id': message.chat_id,
-                    'payment_id': pix_data['payment_id'],
-                    'user_id': update.effective_user.id,
-                    'plan_id': plan_id,
-                    'plan': plan
-                }
+            # Acompanhar o pagamento no monitor único de PIX
+            get_payment_watcher().watch(
+                pix_data['payment_id'],
+                message_id=message.message_id,
+                chat_id=message.chat_id,
+                user_id=update.effective_user.id,
+                plan_id=plan['id']
             )
         else:
             await query.message.reply_text("Erro ao gerar PIX. Tente novamente mais tarde.")
@@ -855,184 +647,196 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
             parse_mode='Markdown'
         )
 
-async def check_payment_auto(context: ContextTypes.DEFAULT_TYPE):
-    job = context.job
-    data = job.data
+# Liberar acesso de um pagamento aprovado (assinatura, status VIP e grupos)
+async def fulfill_payment(payment_id, payment, context):
+    """Retorna o plano liberado ou None se o pagamento não gerou acesso"""
+    # Extrair informações do pagamento (referência do bot: "<user_id>_<plan_id>")
+    external_reference = payment.get('external_reference') or ''
+    user_id, _, plan_id = external_reference.partition('_')
+    if not (user_id.isdigit() and plan_id.isdigit()):
+        logger.warning(f"Pagamento {payment_id} sem referência do bot ({external_reference!r}). Ignorando...")
+        return None
+    user_id = int(user_id)
+    plan_id = int(plan_id)
     
-    payment = check_payment(data['payment_id'])
-    config = load_config()
+    plan = get_plan_catalog().get(plan_id)
+    if not plan:
+        return None
+    
+    # Reservar o pagamento no registro de liberações (processado uma única vez)
+    ledger = get_fulfillment_ledger()
+    if not await ledger.claim(payment_id, user_id, plan_id):
+        logger.info(f"Pagamento {payment_id} já foi processado anteriormente. Ignorando...")
+        return None
     
-    # Carregar mensagens do arquivo
+    success = False
     try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+        # Verificar se é renovação ou nova assinatura
+        if get_subscription_index().get_active(user_id) is not None:
+            success = await renew_vip_subscription(user_id, plan_id, payment_id, context)
+        else:
+            success = await register_vip_subscription(user_id, plan_id, payment_id, context)
+    finally:
+        await ledger.finish(payment_id, success)
+    if not success:
+        return None
+    
+    # Atualizar status VIP nas estatísticas
+    await update_user_vip_status(user_id, True)
+    
+    # Adicionar usuário aos grupos VIP
+    await add_user_to_vip_groups(context.bot, user_id, plan_id)
+    return plan
+
+# Atualizar a mensagem do PIX conforme o status do pagamento (chamado pelo PaymentWatcher)
+async def handle_payment_update(context: ContextTypes.DEFAULT_TYPE, entry, status, payment):
+    payment_id = entry['payment_id']
+    
+    # Liberar o acesso antes de qualquer outra coisa (mesmo sem as mensagens)
+    plan = await fulfill_payment(payment_id, payment, context) if status == 'approved' else None
+    
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         return
     
-    # Criar botão "Já Paguei"
-    keyboard = [[InlineKeyboardButton("✅ Já Paguei", callback_data=f"check_{data['payment_id']}")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    if status == 'approved':
+        if plan:
+            text = f"✅ {messages.render('payment_success', 'Pagamento aprovado!', dias=plan['duration_days'])}\n\nID do Pagamento: {payment_id}"
+        elif get_fulfillment_ledger().state(payment_id) in (CLAIMED, FULFILLED):
+            # Liberado (ou em liberação) pela verificação manual ou pela notificação
+            return
+        else:
+            text = await notify_unfulfilled_payment(payment_id, entry['chat_id'], messages)
+        reply_markup = None  # Remove o botão após aprovação
+    elif status == 'rejected':
+        text = f"❌ {messages.get('payment_error', 'Ocorreu um erro no pagamento. Tente novamente.')}\n\nID do Pagamento: {payment_id}"
+        reply_markup = None  # Remove o botão após rejeição
+    elif status == 'expired':
+        text = f"⌛ {messages.get('payment_expired', 'O PIX expirou. Gere um novo pagamento para continuar.')}\n\nID do Pagamento: {payment_id}"
+        reply_markup = None
+    else:
+        # Pagamento ainda pendente com novo status: mantém o botão "Já Paguei"
+        plan_catalog = get_plan_catalog()
+        text = (
+            f"{messages.get('pix_automatico_instructions', 'Escaneie o QR Code abaixo para pagar automaticamente:')}\n\n"
+            f"Valor: {plan_catalog.price_label(entry['plan_id'])}\n"
+            f"ID do Pagamento: {payment_id}\n\n"
+            f"⏳ Aguardando confirmação do pagamento..."
+        )
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("✅ Já Paguei", callback_data=f"check_{payment_id}")]])
     
-    if payment and payment.get('status') == 'approved':
-        # Verificar se o pagamento já foi processado
-        try:
-            with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
-                
-            # Verificar se já existe uma assinatura com este payment_id
-            payment_already_processed = any(
-                sub.get('payment_id') == str(data['payment_id']) 
-                for sub in subscriptions
-            )
-            
-            if payment_already_processed:
-                logger.info(f"Pagamento {data['payment_id']} já foi processado anteriormente. Ignorando...")
-                # Parar a verificação
-                job.schedule_removal()
-                return
-                
-        except Exception as e:
-            logger.error(f"Erro ao verificar duplicidade: {e}")
-        
-        # Extrair informações do pagamento
-        external_reference = payment.get('external_reference', '')
-        if external_reference:
-            user_id, plan_id = external_reference.split('_')
-            user_id = int(user_id)
-            plan_id = int(plan_id)
-            
-            # Verificar se é renovação ou nova assinatura
-            is_renewal = any(
-                sub['user_id'] == user_id 
-                and datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > datetime.now()
-                for sub in subscriptions
-            )
-            
-            success = False
-            if is_renewal:
-                success = await renew_vip_subscription(user_id, plan_id, data['payment_id'], context)
-            else:
-                success = await register_vip_subscription(user_id, plan_id, data['payment_id'], context)
-            
-            if success:
-                # Atualizar status VIP nas estatísticas
-                await update_user_vip_status(user_id, True)
-                
-                # Adicionar usuário aos grupos VIP
-                await add_user_to_vip_groups(context.bot, user_id, plan_id)
-                
-                try:
-                    # Atualizar mensagem com confirmação
-                    success_message = f"✅ {messages.get('payment_success', 'Pagamento aprovado!').format(dias=data['plan']['duration_days'])}\n\nID do Pagamento: {data['payment_id']}"
-                    await context.bot.edit_message_caption(
-                        chat_id=data['chat_id'],
-                        message_id=data['message_id'],
-                        caption=success_message,
-                        reply_markup=None  # Remove o botão após aprovação
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao atualizar mensagem: {e}")
-                    # Se falhar, tenta enviar uma nova mensagem
-                    await context.bot.send_message(
-                        chat_id=data['chat_id'],
-                        text=success_message
-                    )
-                
-                # Parar a verificação
-                job.schedule_removal()
-    elif payment and payment.get('status') == 'rejected':
-        try:
-            # Atualizar mensagem com erro
-            error_message = f"❌ {messages.get('payment_error', 'Ocorreu um erro no pagamento. Tente novamente.')}\n\nID do Pagamento: {data['payment_id']}"
-            await context.bot.edit_message_caption(
-                chat_id=data['chat_id'],
-                message_id=data['message_id'],
-                caption=error_message,
-                reply_markup=None  # Remove o botão após rejeição
-            )
-        except Exception as e:
-            logger.error(f"Erro ao atualizar mensagem: {e}")
-            await context.bot.send_message(
-                chat_id=data['chat_id'],
-                text=error_message
-            )
-        # Parar a verificação
-        job.schedule_removal()
-    elif payment and payment.get('status') in ['pending', 'in_process']:
-        # Só atualiza se o status mudou
-        current_status = payment.get('status')
-        if current_status != data.get('last_status'):
-            try:
-                status_message = f"{messages.get('pix_automatico_instructions', 'Escaneie o QR Code abaixo para pagar automaticamente:')}\n\nValor: R${data['plan']['price']:.2f}\nID do Pagamento: {data['payment_id']}\n\n⏳ Aguardando confirmação do pagamento..."
-                await context.bot.edit_message_caption(
-                    chat_id=data['chat_id'],
-                    message_id=data['message_id'],
-                    caption=status_message,
-                    reply_markup=reply_markup  # Mantém o botão durante a espera
-                )
-                # Atualiza o último status
-                data['last_status'] = current_status
-            except Exception as e:
-                logger.error(f"Erro ao atualizar mensagem: {e}")
-                # Se falhar, tenta enviar uma nova mensagem
-                await context.bot.send_message(
-                    chat_id=data['chat_id'],
-                    text=status_message,
-                    reply_markup=reply_markup
-                )
+    if entry.get('message_id') is None:
+        # Pagamento sem mensagem de PIX acompanhada (ex.: notificação após reinício)
+        await context.bot.send_message(
+            chat_id=entry['chat_id'],
+            text=text,
+            reply_markup=reply_markup,
+            rate_limit_args=PRIORITY_FULFILLMENT
+        )
+        return
+    
+    try:
+        await context.bot.edit_message_caption(
+            chat_id=entry['chat_id'],
+            message_id=entry['message_id'],
+            caption=text,
+            reply_markup=reply_markup,
+            rate_limit_args=PRIORITY_FULFILLMENT
+        )
+    except Exception as e:
+        logger.error(f"Erro ao atualizar mensagem: {e}")
+        # Se falhar, tenta enviar uma nova mensagem
+        await context.bot.send_message(
+            chat_id=entry['chat_id'],
+            text=text,
+            reply_markup=reply_markup,
+            rate_limit_args=PRIORITY_FULFILLMENT
+        )
+
+# Pagamento aprovado que não gerou acesso: avisa o admin e retorna o texto para o usuário
+async def notify_unfulfilled_payment(payment_id, user_id, messages):
+    try:
+        await get_admin_digest().error(
+            f"⚠️ Pagamento {payment_id} aprovado, mas o acesso do usuário {user_id} não foi liberado.\n"
+            f"Verifique o plano do pagamento e libere o acesso manualmente."
+        )
+    except Exception as e:
+        logger.error(f"Erro ao notificar admin sobre o pagamento {payment_id}: {e}")
+    return (
+        f"⚠️ {messages.get('payment_unfulfilled', 'Pagamento aprovado, mas não foi possível liberar seu acesso. O administrador já foi avisado.')}"
+        f"\n\nID do Pagamento: {payment_id}"
+    )
+
+# Notificação de pagamento do Mercado Pago (executado no loop do bot)
+def on_payment_notification(payment_id):
+    # O status mudou: a próxima consulta não pode vir do cache
+    get_payment_cache().invalidate(payment_id)
+    
+    # Pagamento acompanhado: antecipa a consulta no monitor de PIX
+    if get_payment_watcher().poll_now(payment_id):
+        return
+    # Pagamento fora do monitor: consulta e libera o acesso diretamente
+    if _application is not None:
+        _application.job_queue.run_once(handle_unwatched_payment, when=0, data={'payment_id': str(payment_id)})
+
+async def handle_unwatched_payment(context: ContextTypes.DEFAULT_TYPE):
+    payment_id = context.job.data['payment_id']
+    payment = await check_payment(payment_id)
+    if not payment or payment.get('status') != 'approved':
+        return
+    # Pagamentos de fora do bot podem ter outra referência (ou nenhuma)
+    user_id, _, plan_id = (payment.get('external_reference') or '').partition('_')
+    if not (user_id.isdigit() and plan_id.isdigit()):
+        logger.debug(f"Pagamento {payment_id} sem referência do bot ({payment.get('external_reference')!r}). Ignorando...")
+        return
+    entry = {'payment_id': payment_id, 'chat_id': int(user_id), 'plan_id': int(plan_id)}
+    await handle_payment_update(context, entry, 'approved', payment)
 
 async def check_payment_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     payment_id = query.data.split('_')[1]
-    payment = check_payment(payment_id)
-    config = load_config()
+    payment = await check_payment(payment_id)
     
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await query.message.reply_text("Erro ao carregar mensagens.")
         return
     
     if payment and payment.get('status') == 'approved':
-        # Extrair informações do pagamento
-        external_reference = payment.get('external_reference', '')
-        if external_reference:
-            user_id, plan_id = external_reference.split('_')
-            
-            # Encontrar o plano
-            plan = next((p for p in config['vip_plans'] if p['id'] == int(plan_id)), None)
-            if not plan:
-                await query.message.reply_text("Plano não encontrado.")
-                return
-            
-            # Registrar assinatura
-            if await register_vip_subscription(int(user_id), int(plan_id), payment_id, context):
-                # Adicionar usuário aos grupos VIP
-                await add_user_to_vip_groups(context.bot, int(user_id), int(plan_id))
-                
-                try:
-                    # Atualizar mensagem com confirmação
-                    success_message = f"✅ {messages.get('payment_success', 'Pagamento aprovado!').format(dias=plan['duration_days'])}\n\nID do Pagamento: {payment_id}"
-                    await query.message.edit_caption(caption=success_message)
-                    
-                    # Remover botão
-                    await query.message.edit_reply_markup(reply_markup=None)
-                except Exception as e:
-                    logger.error(f"Erro ao atualizar mensagem: {e}")
-                    # Se falhar, tenta enviar uma nova mensagem
-                    await query.message.reply_text(success_message)
-                
-                # Parar verificação automática se existir
-                if hasattr(context, 'job_queue') and context.job_queue:
-                    for job in context.job_queue.jobs():
-                        if job.data.get('payment_id') == payment_id:
-                            job.schedule_removal()
+        # Parar o acompanhamento automático antes de liberar o acesso
+        get_payment_watcher().discard(payment_id)
+        
+        # Registrar assinatura, status VIP e grupos
+        plan = await fulfill_payment(payment_id, payment, context)
+        if plan:
+            success_message = f"✅ {messages.render('payment_success', 'Pagamento aprovado!', dias=plan['duration_days'])}\n\nID do Pagamento: {payment_id}"
+        elif get_fulfillment_ledger().state(payment_id) in (CLAIMED, FULFILLED):
+            # Já liberado (ou em liberação) pelo monitor de PIX ou pela notificação
+            success_message = f"✅ Pagamento já confirmado! Seu acesso VIP já foi liberado.\n\nID do Pagamento: {payment_id}"
+        else:
+            success_message = await notify_unfulfilled_payment(payment_id, query.from_user.id, messages)
+        try:
+            # Atualizar mensagem com confirmação
+            # (chamadas diretas ao bot: os atalhos da mensagem não aceitam prioridade)
+            await context.bot.edit_message_caption(
+                chat_id=query.message.chat_id,
+                message_id=query.message.message_id,
+                caption=success_message,
+                reply_markup=None,
+                rate_limit_args=PRIORITY_FULFILLMENT
+            )
+        except Exception as e:
+            logger.error(f"Erro ao atualizar mensagem: {e}")
+            # Se falhar, tenta enviar uma nova mensagem
+            await context.bot.send_message(
+                chat_id=query.message.chat_id,
+                text=success_message,
+                rate_limit_args=PRIORITY_FULFILLMENT
+            )
     else:
         status = messages.get('payment_pending', 'Aguardando confirmação do pagamento...')
         if payment:
@@ -1049,12 +853,9 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Acesso negado.")
         return
     
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await update.message.reply_text("Erro ao carregar mensagens.")
         return
     
@@ -1062,6 +863,7 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("📊 Estatísticas", callback_data="admin_stats")],
         [InlineKeyboardButton("⚙️ Configurações", callback_data="admin_settings")],
         [InlineKeyboardButton("👥 Usuários VIP", callback_data="admin_vip_users")],
+        [InlineKeyboardButton("🔍 Membros sem assinatura", callback_data="admin_reconcile")],
         [InlineKeyboardButton("📝 Mensagens", callback_data="admin_messages")],
         [InlineKeyboardButton("🔄 Manutenção", callback_data="admin_maintenance")],
         [InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")]
@@ -1084,12 +886,9 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await query.message.reply_text("Acesso negado.")
         return
     
-    # Carregar mensagens do arquivo
-    try:
-        with open('messages.txt', 'r', encoding='utf-8') as f:
-            messages = dict(line.strip().split('=', 1) for line in f if line.strip())
-    except Exception as e:
-        logger.error(f"Erro ao carregar mensagens: {e}")
+    # Carregar mensagens (templates em cache)
+    messages = load_messages()
+    if messages is None:
         await query.message.reply_text("Erro ao carregar mensagens.")
         return
     
@@ -1233,17 +1032,17 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
     if action == "stats":
         # Mostrar estatísticas
         try:
-            with open('stats.json', 'r', encoding='utf-8') as f:
-                stats = json.load(f)
+            await get_user_stats_writer().flush()
+            stats = await persistence.read(get_storage().get_stats_summary, last_users=5)
             
             text = "📊 Estatísticas do Bot\n\n"
             text += f"Total de Usuários: {stats['total_users']}\n"
-            text += f"Total de VIPs: {sum(1 for u in stats['users'] if u.get('is_vip', False))}\n"
+            text += f"Total de VIPs: {stats['total_vips']}\n"
             text += f"Última Atualização: {stats['last_update']}\n\n"
             text += "👥 Últimos Usuários:\n"
             
             # Mostrar os últimos 5 usuários
-            for user in stats['users'][-5:]:
+            for user in stats['last_users']:
                 text += f"\nID: {user['id']}"
                 if user['username']:
                     text += f"\nUsername: @{user['username']}"
@@ -1253,6 +1052,16 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
                 text += f"\nData: {user['joined_date']}"
                 text += f"\nVIP: {'✅' if user.get('is_vip', False) else '❌'}\n"
             
+            outbound = get_outbound_dispatcher().metrics()
+            text += "\n📤 Fila de envio:\n"
+            for name, depth in outbound['queue_depth'].items():
+                text += f"{name}: {depth} na fila, {outbound['sent'][name]} enviados, espera máx. {outbound['max_wait'][name]}s\n"
+            text += f"RetryAfter recebidos: {outbound['retry_after_count']}"
+            if outbound['last_retry_after'] is not None:
+                text += f" (último: {outbound['last_retry_after']:.0f}s)"
+            text += "\n"
+            text += f"🎟️ Convites em estoque: {sum(get_invite_pool().stats().values())}\n"
+            
         except Exception as e:
             logger.error(f"Erro ao carregar estatísticas: {e}")
             text = "Erro ao carregar estatísticas."
@@ -1262,18 +1071,8 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await query.message.edit_text(text, reply_markup=reply_markup)
         
     elif action == "vip_users":
-        # Listar usuários VIP
-        try:
-            with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
-        except FileNotFoundError:
-            subscriptions = []
-        
-        # Filtrar assinaturas ativas
-        active_subscriptions = [
-            sub for sub in subscriptions 
-            if datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > datetime.now()
-        ]
+        # Listar usuários VIP (assinaturas ativas)
+        active_subscriptions = get_subscription_index().active_subscriptions()
         
         if active_subscriptions:
             text = "👥 Usuários VIP Ativos:\n\n"
@@ -1288,6 +1087,24 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.message.edit_text(text, reply_markup=reply_markup)
         
+    elif action == "reconcile":
+        # Membros dos grupos VIP sem assinatura ativa (índice mantido pelos updates chat_member)
+        report = get_membership_index().reconcile()
+        text = "🔍 Membros sem assinatura ativa\n"
+        for group_id, group_report in report.items():
+            group_info = get_group_registry().cached(group_id)
+            title = group_info['title'] if group_info and group_info['title'] else group_id
+            text += f"\n{title}: {group_report['members']} membros observados, {len(group_report['unentitled'])} sem assinatura\n"
+            for user_id in group_report['unentitled'][:20]:
+                text += f"• {user_id}\n"
+            if len(group_report['unentitled']) > 20:
+                text += f"... e mais {len(group_report['unentitled']) - 20}\n"
+        text += "\nSó aparecem membros que entraram ou mudaram de status desde que o bot é admin do grupo."
+        
+        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.message.edit_text(text[:4096], reply_markup=reply_markup)
+        
     elif action == "maintenance":
         # Modo manutenção
         keyboard = [
@@ -1310,6 +1127,7 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
             [InlineKeyboardButton("📊 Estatísticas", callback_data="admin_stats")],
             [InlineKeyboardButton("⚙️ Configurações", callback_data="admin_settings")],
             [InlineKeyboardButton("👥 Usuários VIP", callback_data="admin_vip_users")],
+            [InlineKeyboardButton("🔍 Membros sem assinatura", callback_data="admin_reconcile")],
             [InlineKeyboardButton("📝 Mensagens", callback_data="admin_messages")],
             [InlineKeyboardButton("🔄 Manutenção", callback_data="admin_maintenance")],
             [InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")]
@@ -1327,6 +1145,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Callback de edição recebido: {query.data}")
     
     config = load_config()
+    plan_catalog = get_plan_catalog(config)
     if str(update.effective_user.id) != config['admin_id']:
         await query.message.reply_text("Acesso negado.")
         return
@@ -1383,7 +1202,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Verifica se é uma edição de plano VIP
     if query.data.startswith("admin_edit_plan_") and not query.data.endswith("_input"):
         plan_id = int(query.data.split('_')[-1])
-        plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+        plan = plan_catalog.get(plan_id)
         if not plan:
             await query.message.reply_text("Plano não encontrado.")
             return
@@ -1407,7 +1226,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Verifica se é uma edição específica do plano
     if query.data.startswith("admin_edit_plan_name_input_"):
         plan_id = int(query.data.split('_')[-1])
-        plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+        plan = plan_catalog.get(plan_id)
         if not plan:
             await query.message.reply_text("Plano não encontrado.")
             return
@@ -1424,7 +1243,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     elif query.data.startswith("admin_edit_plan_price_input_"):
         plan_id = int(query.data.split('_')[-1])
-        plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+        plan = plan_catalog.get(plan_id)
         if not plan:
             await query.message.reply_text("Plano não encontrado.")
             return
@@ -1441,7 +1260,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     elif query.data.startswith("admin_edit_plan_duration_input_"):
         plan_id = int(query.data.split('_')[-1])
-        plan = next((p for p in config['vip_plans'] if p['id'] == plan_id), None)
+        plan = plan_catalog.get(plan_id)
         if not plan:
             await query.message.reply_text("Plano não encontrado.")
             return
@@ -1456,6 +1275,27 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         context.user_data['editing'] = f"plan_duration_{plan_id}"
 
+# Pausar, retomar ou cancelar um broadcast em andamento
+async def handle_broadcast_control(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    if str(update.effective_user.id) != config['admin_id']:
+        await query.answer("Acesso negado.")
+        return
+    
+    _, action, broadcast_id = query.data.split('_')
+    engine = get_broadcast_engine()
+    if action == 'pause':
+        done = await engine.pause(int(broadcast_id))
+        answer = "⏸️ Pausando após o lote atual..." if done else "Broadcast não está em andamento."
+    elif action == 'resume':
+        done = await engine.resume(int(broadcast_id))
+        answer = "▶️ Broadcast retomado." if done else "Broadcast não está pausado."
+    else:
+        done = await engine.cancel(int(broadcast_id))
+        answer = "⏹️ Cancelando broadcast..." if done else "Broadcast já finalizado."
+    await query.answer(answer)
+
 async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if 'editing' not in context.user_data and 'broadcast_type' not in context.user_data:
         return
@@ -1472,63 +1312,11 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message_text = update.message.text
         
         try:
-            # Carregar usuários
-            with open('stats.json', 'r', encoding='utf-8') as f:
-                stats = json.load(f)
-            
-            # Carregar assinaturas VIP
-            with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
-            
-            # Filtrar usuários VIP ativos
-            active_vip_users = {
-                sub['user_id'] for sub in subscriptions
-                if datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > datetime.now()
-            }
-            
-            # Preparar lista de destinatários
-            if broadcast_type == 'all':
-                recipients = [user['id'] for user in stats['users']]
-            else:  # vip
-                recipients = [user['id'] for user in stats['users'] if user['id'] in active_vip_users]
-            
-            # Enviar mensagem
-            success_count = 0
-            error_count = 0
-            
-            # Mensagem de progresso
-            progress_message = await update.message.reply_text(
-                f"📢 Enviando mensagem para {len(recipients)} usuários...\n"
-                f"✅ Enviados: 0\n"
-                f"❌ Erros: 0"
-            )
+            # Garantir que os usuários em lote já estejam no banco
+            await get_user_stats_writer().flush()
             
-            for user_id in recipients:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=message_text
-                    )
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Erro ao enviar mensagem para {user_id}: {e}")
-                    error_count += 1
-                
-                # Atualizar mensagem de progresso a cada 10 envios
-                if (success_count + error_count) % 10 == 0:
-                    await progress_message.edit_text(
-                        f"📢 Enviando mensagem para {len(recipients)} usuários...\n"
-                        f"✅ Enviados: {success_count}\n"
-                        f"❌ Erros: {error_count}"
-                    )
-            
-            # Mensagem final
-            await progress_message.edit_text(
-                f"📢 Broadcast concluído!\n\n"
-                f"✅ Mensagens enviadas: {success_count}\n"
-                f"❌ Erros: {error_count}\n\n"
-                f"Tipo: {'Todos os usuários' if broadcast_type == 'all' else 'Usuários VIP'}"
-            )
+            # O envio roda em segundo plano; o progresso é atualizado na mensagem do broadcast
+            await get_broadcast_engine().start(broadcast_type, message_text, update.effective_chat.id)
             
             # Limpar estado de broadcast
             del context.user_data['broadcast_type']
@@ -1560,6 +1348,7 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     editing = context.user_data['editing']
     
     try:
+        config = load_config_for_update()
         if editing == 'bot_token':
             config['bot_token'] = new_value
             success_message = "✅ Token do bot atualizado com sucesso!"
@@ -1577,7 +1366,7 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         # Salvar configurações
-        if save_config(config):
+        if await save_config_async(config):
             # Limpar estado de edição
             del context.user_data['editing']
             
@@ -1599,7 +1388,7 @@ async def handle_maintenance_toggle(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     await query.answer()
     
-    config = load_config()
+    config = load_config_for_update()
     if str(update.effective_user.id) != config['admin_id']:
         return
     
@@ -1612,7 +1401,7 @@ async def handle_maintenance_toggle(update: Update, context: ContextTypes.DEFAUL
     config['admin_settings']['maintenance_mode'] = not current_mode
     
     # Salvar configurações
-    if save_config(config):
+    if await save_config_async(config):
         # Atualizar mensagem
         status = "ativado" if not current_mode else "desativado"
         keyboard = [
@@ -1637,7 +1426,7 @@ async def handle_payment_toggle(update: Update, context: ContextTypes.DEFAULT_TY
     logger.info(f"Callback de toggle recebido: {query.data}")
     
     try:
-        config = load_config()
+        config = load_config_for_update()
         logger.info(f"Config carregada: {config}")
         
         if str(update.effective_user.id) != config['admin_id']:
@@ -1673,7 +1462,7 @@ async def handle_payment_toggle(update: Update, context: ContextTypes.DEFAULT_TY
         
         # Salva a configuração
         logger.info("Tentando salvar configuração...")
-        if save_config(config):
+        if await save_config_async(config):
             logger.info("Configuração salva com sucesso")
             # Atualiza a mensagem
             keyboard = [
@@ -1706,191 +1495,104 @@ async def handle_payment_toggle(update: Update, context: ContextTypes.DEFAULT_TY
         await query.message.reply_text("❌ Erro ao alternar método de pagamento. Tente novamente.")
 
 async def check_expired_subscriptions(context: ContextTypes.DEFAULT_TYPE):
-    """Verifica e remove assinaturas expiradas."""
+    """Remove as assinaturas expiradas e agenda a próxima verificação."""
+    failed = False
     try:
-        logger.info("Iniciando verificação de assinaturas expiradas...")
-        # Carregar assinaturas
-        with json_lock:
-            with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
+        subscription_index = get_subscription_index()
         
-        # Carregar configuração
-        config = load_config()
+        # Buscar assinaturas expiradas (exceto permanentes) na lista ordenada de expiração
         current_time = datetime.now()
-        logger.info(f"Verificando assinaturas em: {current_time}")
-        logger.info(f"Total de assinaturas carregadas: {len(subscriptions)}")
+        expired_subscriptions = subscription_index.expired(current_time)
+        if not expired_subscriptions:
+            return
         
-        # Filtrar assinaturas expiradas (exceto permanentes)
-        expired_subscriptions = []
-        for sub in subscriptions:
-            try:
-                logger.info(f"\nVerificando assinatura do usuário {sub['user_id']}:")
-                logger.info(f"É permanente? {sub.get('is_permanent', False)}")
-                
-                if not sub.get('is_permanent', False):
-                    end_date = datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S")
-                    logger.info(f"Data de expiração: {end_date}")
-                    logger.info(f"Data atual: {current_time}")
-                    logger.info(f"Está expirada? {end_date <= current_time}")
-                    
-                    if end_date <= current_time:
-                        logger.info(f"Assinatura do usuário {sub['user_id']} está expirada!")
-                        expired_subscriptions.append(sub)
-                else:
-                    logger.info(f"Assinatura do usuário {sub['user_id']} é permanente, ignorando...")
-            except Exception as e:
-                logger.error(f"Erro ao processar assinatura: {e}")
+        logger.info(f"Encontradas {len(expired_subscriptions)} assinaturas expiradas em {current_time}")
         
-        logger.info(f"\nEncontradas {len(expired_subscriptions)} assinaturas expiradas")
+        # Remover dos grupos, atualizar status VIP e avisar os usuários em lote
+        summary = await get_expiry_executor().run(context.bot, expired_subscriptions)
+        if summary['failed'] or summary['skipped']:
+            await get_admin_digest().error(
+                f"⚠️ Expiração de {summary['subscriptions']} assinaturas: "
+                f"{summary['removed']} remoções, {summary['failed']} falhas, "
+                f"{summary['skipped']} grupos sem permissão para banir"
+            )
         
+        # Remover assinaturas expiradas do banco
+        await subscription_index.remove_many(sub['id'] for sub in expired_subscriptions)
         for sub in expired_subscriptions:
-            try:
-                # Encontrar o plano
-                plan = next((p for p in config['vip_plans'] if p['id'] == sub['plan_id']), None)
-                if plan:
-                    logger.info(f"Processando expiração do usuário {sub['user_id']} - Plano: {plan['name']}")
-                    # Remover usuário dos grupos
-                    for group_id in plan['groups']:
-                        try:
-                            await context.bot.ban_chat_member(
-                                chat_id=group_id,
-                                user_id=sub['user_id']
-                            )
-                            # Desbanir imediatamente para permitir reentrada
-                            await context.bot.unban_chat_member(
-                                chat_id=group_id,
-                                user_id=sub['user_id']
-                            )
-                            logger.info(f"Usuário {sub['user_id']} removido do grupo {group_id}")
-                        except Exception as e:
-                            logger.error(f"Erro ao remover usuário {sub['user_id']} do grupo {group_id}: {e}")
-                    
-                    # Atualizar status VIP
-                    await update_user_vip_status(sub['user_id'], False)
-                    
-                    # Notificar usuário
-                    try:
-                        await context.bot.send_message(
-                            chat_id=sub['user_id'],
-                            text=f"⚠️ Sua assinatura VIP expirou!\n\n"
-                                 f"Plano: {plan['name']}\n"
-                                 f"Data de expiração: {sub['end_date']}\n\n"
-                                 f"Para continuar com acesso VIP, adquira um novo plano usando /start"
-                        )
-                        logger.info(f"Notificação de expiração enviada para usuário {sub['user_id']}")
-                    except Exception as e:
-                        logger.error(f"Erro ao notificar usuário {sub['user_id']}: {e}")
-            
-            except Exception as e:
-                logger.error(f"Erro ao processar assinatura expirada: {e}")
-        
-        # Remover assinaturas expiradas do arquivo
-        if expired_subscriptions:
-            subscriptions = [
-                sub for sub in subscriptions
-                if sub not in expired_subscriptions
-            ]
-            with json_lock:
-                with open('subscriptions.json', 'w', encoding='utf-8') as f:
-                    json.dump(subscriptions, f, indent=4, ensure_ascii=False)
-            logger.info(f"Removidas {len(expired_subscriptions)} assinaturas expiradas do arquivo")
+            get_reminder_wheel().cancel(sub['id'])
+        logger.info(f"Removidas {len(expired_subscriptions)} assinaturas expiradas do banco")
             
     except Exception as e:
         logger.error(f"Erro ao verificar assinaturas expiradas: {e}")
+        failed = True
+    finally:
+        # Agendar a próxima verificação para o próximo prazo de expiração
+        # (após uma falha, espera RETRY_DELAY para não repetir em loop)
+        get_expiry_scheduler().arm(retry_delay=RETRY_DELAY if failed else None)
 
-async def check_expiring_subscriptions(context: ContextTypes.DEFAULT_TYPE):
-    """Verifica e notifica assinaturas próximas de expirar."""
+async def send_expiry_reminders(context: ContextTypes.DEFAULT_TYPE, due_reminders):
+    """Envia os avisos de expiração vencidos na roda de timers."""
     try:
-        logger.info("Iniciando verificação de assinaturas próximas de expirar...")
-        # Carregar assinaturas
-        with json_lock:
-            with open('subscriptions.json', 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
+        subscription_index = get_subscription_index()
         
         # Carregar configuração
-        config = load_config()
+        plan_catalog = get_plan_catalog()
         current_time = datetime.now()
-        logger.info(f"Verificando assinaturas em: {current_time}")
-        logger.info(f"Total de assinaturas carregadas: {len(subscriptions)}")
-        
-        # Filtrar assinaturas próximas de expirar
-        expiring_subscriptions = [
-            sub for sub in subscriptions
-            if not sub.get('is_permanent', False) and 
-            datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S") > current_time
-        ]
         
-        logger.info(f"Encontradas {len(expiring_subscriptions)} assinaturas próximas de expirar")
+        if due_reminders:
+            logger.info(f"Enviando {len(due_reminders)} avisos de expiração")
         
-        for sub in expiring_subscriptions:
+        for sub_id, notification_key in due_reminders:
             try:
+                # A assinatura pode ter sido renovada ou removida depois do agendamento
+                sub = subscription_index.get(sub_id)
+                if not sub or sub.get(notification_key, False):
+                    continue
+                
                 # Encontrar o plano
-                plan = next((p for p in config['vip_plans'] if p['id'] == sub['plan_id']), None)
+                plan = plan_catalog.get(sub['plan_id'])
                 if plan:
                     # Calcular dias restantes
                     end_date = datetime.strptime(sub['end_date'], "%Y-%m-%d %H:%M:%S")
                     time_left = end_date - current_time
+                    if time_left.total_seconds() <= 0:
+                        continue
                     days_left = time_left.days
                     hours_left = time_left.seconds // 3600
                     
-                    logger.info(f"Verificando assinatura do usuário {sub['user_id']}:")
-                    logger.info(f"Dias restantes: {days_left}")
-                    logger.info(f"Horas restantes: {hours_left}")
-                    
-                    # Verificar se deve notificar (3, 2 ou 1 dia, ou menos de 24 horas)
-                    should_notify = False
-                    notification_key = None
-                    
-                    if days_left == 0 and hours_left <= 24:
-                        should_notify = True
-                        notification_key = "notified_1"
-                    elif days_left == 1:
-                        should_notify = True
-                        notification_key = "notified_1"
-                    elif days_left == 2:
-                        should_notify = True
-                        notification_key = "notified_2"
-                    elif days_left == 3:
-                        should_notify = True
-                        notification_key = "notified_3"
-                    
-                    if should_notify and not sub.get(notification_key, False):
-                        # Notificar usuário
-                        try:
-                            message = f"⚠️ Sua assinatura VIP está próxima de expirar!\n\n"
-                            message += f"Plano: {plan['name']}\n"
-                            if days_left == 0:
-                                message += f"Horas restantes: {hours_left}\n"
-                            else:
-                                message += f"Dias restantes: {days_left}\n"
-                            message += f"Data de expiração: {sub['end_date']}\n\n"
-                            message += f"Para renovar seu acesso VIP, use /start e escolha um novo plano! 🎉"
-                            
-                            await context.bot.send_message(
-                                chat_id=sub['user_id'],
-                                text=message
-                            )
-                            logger.info(f"Notificação enviada para usuário {sub['user_id']}")
-                            
-                            # Marcar como notificado
-                            sub[notification_key] = True
-                            logger.info(f"Usuário {sub['user_id']} marcado como notificado para {notification_key}")
-                            
-                        except Exception as e:
-                            logger.error(f"Erro ao notificar usuário {sub['user_id']}: {e}")
+                    # Notificar usuário
+                    try:
+                        message = f"⚠️ Sua assinatura VIP está próxima de expirar!\n\n"
+                        message += f"Plano: {plan['name']}\n"
+                        if days_left == 0:
+                            message += f"Horas restantes: {hours_left}\n"
+                        else:
+                            message += f"Dias restantes: {days_left}\n"
+                        message += f"Data de expiração: {sub['end_date']}\n\n"
+                        message += f"Para renovar seu acesso VIP, use /start e escolha um novo plano! 🎉"
+                        
+                        await context.bot.send_message(
+                            chat_id=sub['user_id'],
+                            text=message,
+                            rate_limit_args=PRIORITY_NOTICE
+                        )
+                        logger.info(f"Notificação enviada para usuário {sub['user_id']} ({notification_key})")
+                        
+                        # Marcar como notificado (apenas esta linha é atualizada)
+                        await subscription_index.set_flag(sub['id'], notification_key, True)
+                        
+                    except Exception as e:
+                        logger.error(f"Erro ao notificar usuário {sub['user_id']}: {e}")
             
             except Exception as e:
-                logger.error(f"Erro ao processar assinatura próxima de expirar: {e}")
-        
-        # Salvar alterações (marcação de notificados)
-        if expiring_subscriptions:
-            with json_lock:
-                with open('subscriptions.json', 'w', encoding='utf-8') as f:
-                    json.dump(subscriptions, f, indent=4, ensure_ascii=False)
-            logger.info("Alterações salvas no arquivo de assinaturas")
-            
+                logger.error(f"Erro ao processar aviso de expiração: {e}")
+        
     except Exception as e:
-        logger.error(f"Erro ao verificar assinaturas próximas de expirar: {e}")
+        logger.error(f"Erro ao enviar avisos de expiração: {e}")
+    finally:
+        # Agendar o próximo aviso
+        get_reminder_wheel().arm()
 
 async def initial_check(context: ContextTypes.DEFAULT_TYPE):
     """Verificação inicial de assinaturas quando o bot inicia."""
@@ -1899,8 +1601,11 @@ async def initial_check(context: ContextTypes.DEFAULT_TYPE):
     # Verificar assinaturas expiradas
     await check_expired_subscriptions(context)
     
-    # Verificar assinaturas próximas de expirar
-    await check_expiring_subscriptions(context)
+    # Calcular os horários dos avisos de expiração das assinaturas ativas
+    reminder_wheel = get_reminder_wheel()
+    reminder_wheel.schedule_many(get_subscription_index().expiring())
+    reminder_wheel.arm()
+    logger.info(f"{len(reminder_wheel)} avisos de expiração agendados")
     
     logger.info("Verificação inicial concluída!")
 
@@ -1913,15 +1618,7 @@ async def handle_back_to_plans(update: Update, context: ContextTypes.DEFAULT_TYP
         del context.user_data['waiting_for_proof']
     
     # Retornar para a lista de planos
-    keyboard = []
-    config = load_config()
-    for plan in config['vip_plans']:
-        keyboard.append([InlineKeyboardButton(
-            f"💎 {plan['name']} - R${plan['price']:.2f}",
-            callback_data=f"plan_{plan['id']}"
-        )])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = plans_markup()
     await query.message.edit_text(
         "Escolha um dos planos VIP disponíveis:",
         reply_markup=reply_markup
@@ -1941,9 +1638,9 @@ async def check_bot_initialization(bot, config):
         except ImportError:
             missing_deps.append("qrcode")
         try:
-            import mercadopago
+            import aiohttp
         except ImportError:
-            missing_deps.append("mercadopago")
+            missing_deps.append("aiohttp")
         try:
             from PIL import Image
         except ImportError:
@@ -1986,7 +1683,14 @@ async def check_bot_initialization(bot, config):
             for error in config_errors:
                 status_message += f"• {error}\n"
                 
-        if not (missing_deps or missing_files or config_errors):
+        # Grupos VIP que o bot não consegue administrar (registro aquecido no post_init)
+        group_problems = get_group_registry().problems()
+        if group_problems:
+            status_message += f"\n⚠️ Grupos com problema:\n"
+            for group_id, problem in group_problems.items():
+                status_message += f"• {group_id}: {problem}\n"
+                
+        if not (missing_deps or missing_files or config_errors or group_problems):
             status_message += "\n✅ Todas as verificações passaram com sucesso!"
             
         # Enviar mensagem ao admin
@@ -1994,7 +1698,8 @@ async def check_bot_initialization(bot, config):
             await bot.send_message(
                 chat_id=config['admin_id'],
                 text=status_message,
-                parse_mode='Markdown'
+                parse_mode='Markdown',
+                rate_limit_args=PRIORITY_NOTICE
             )
             logger.info("Relatório de inicialização enviado ao admin")
         except Exception as e:
@@ -2006,12 +1711,90 @@ async def check_bot_initialization(bot, config):
             await bot.send_message(
                 chat_id=config['admin_id'],
                 text=f"❌ *Erro na inicialização do bot*\n\nErro: {str(e)}",
-                parse_mode='Markdown'
+                parse_mode='Markdown',
+                rate_limit_args=PRIORITY_NOTICE
             )
         except:
             logger.error("Não foi possível enviar mensagem de erro ao admin")
 
 
+async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Atualiza o registro de grupos quando o status ou as permissões do bot mudam"""
+    chat_member = update.my_chat_member
+    if chat_member.chat.type not in ('group', 'supergroup'):
+        return
+    info = get_group_registry().update_from_member(chat_member.chat, chat_member.new_chat_member)
+    
+    # Permissões recuperadas: repor o estoque de convites ou criar o link de pedido de entrada
+    if info['can_invite_users']:
+        if get_access_mode() == 'join_request':
+            await get_join_request_gate().ensure_links(context.bot)
+        else:
+            get_invite_pool().request_refill()
+    
+    # Avisar o admin se um grupo VIP ficou sem as permissões necessárias
+    if str(chat_member.chat.id) in get_plan_catalog().group_ids():
+        missing = missing_rights(info, 'can_invite_users', 'can_restrict_members')
+        if missing:
+            await get_admin_digest().error(
+                f"⚠️ O bot perdeu permissões no grupo VIP {chat_member.chat.title or chat_member.chat.id}: {', '.join(missing)}"
+            )
+
+async def handle_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Mantém o índice de membros dos grupos VIP (entradas, saídas e remoções)"""
+    chat_member = update.chat_member
+    if str(chat_member.chat.id) not in get_plan_catalog().group_ids():
+        return
+    try:
+        await get_membership_index().update(chat_member)
+    except Exception as e:
+        logger.error(f"Erro ao atualizar índice de membros: {e}")
+
+async def handle_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Aprova pedidos de entrada de quem tem assinatura ativa com o grupo"""
+    # No modo de links de convite os pedidos ficam para o admin decidir
+    if get_access_mode() != 'join_request':
+        return
+    try:
+        await get_join_request_gate().handle(context.bot, update.chat_join_request)
+    except Exception as e:
+        logger.error(f"Erro ao processar pedido de entrada: {e}")
+
+async def post_init(application):
+    """Inicia os serviços que dependem do loop de eventos do bot."""
+    global _application, _bot_loop
+    _application = application
+    _bot_loop = asyncio.get_running_loop()
+    
+    config = load_config()
+    get_user_stats_writer(config).start()
+    get_admin_digest(config).start(application.bot)
+    
+    # Tipo e permissões do bot em todos os grupos VIP
+    await get_group_registry().warm(application.bot)
+    
+    # Modo pedido de entrada: garantir o link fixo de cada grupo
+    if get_access_mode(config) == 'join_request':
+        await get_join_request_gate().ensure_links(application.bot)
+    
+    # Verificar inicialização e enviar relatório ao admin
+    await check_bot_initialization(application.bot, config)
+    
+    # Com o webhook do Mercado Pago configurado, a consulta periódica vira rede de segurança
+    get_payment_watcher().set_push_enabled(bool(config.get('mercadopago', {}).get('webhook_secret')))
+    
+    # Broadcasts em segundo plano (retoma os interrompidos por um reinício)
+    broadcast_engine = get_broadcast_engine()
+    broadcast_engine.attach(application.bot)
+    await broadcast_engine.resume_interrupted()
+
+async def post_shutdown(application):
+    """Grava os lotes pendentes e aguarda as escritas antes de encerrar o bot."""
+    await get_user_stats_writer().close()
+    await get_admin_digest().close()
+    await get_mercadopago_client().close()
+    persistence.shutdown()
+
 def main():
     """Função principal que inicia o bot"""
     global _bot_instance
@@ -2021,17 +1804,30 @@ def main():
         logger.error("Não foi possível carregar config.json")
         return
 
+    # Abrir o banco de dados (importa subscriptions.json/stats.json na primeira execução)
+    # e carregar em memória o índice de assinaturas, o registro de liberações e os membros dos grupos
+    get_storage()
+    get_subscription_index()
+    get_fulfillment_ledger()
+    get_membership_index()
+
     # Criar a instância do bot
     _bot_instance = Bot(token=config['bot_token'])
     
     # Criar a aplicação
-    application = Application.builder().token(config['bot_token']).build()
+    # Todas as chamadas à API passam pela fila de saída com prioridade
+    application = (
+        Application.builder()
+        .token(config['bot_token'])
+        .rate_limiter(get_outbound_dispatcher())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     try:
-        # Verificar inicialização e enviar relatório ao admin
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(check_bot_initialization(_bot_instance, config))
         
         # Adicionar job para verificação inicial (após 5 segundos)
         application.job_queue.run_once(
@@ -2039,19 +1835,19 @@ def main():
             when=5  # 5 segundos após iniciar
         )
         
-        # Adicionar job para verificar assinaturas expiradas (a cada 15 minutos)
-        application.job_queue.run_repeating(
-            check_expired_subscriptions,
-            interval=900,  # 15 minutos
-            first=10  # Primeira verificação após 10 segundos
-        )
+        # Agendar a remoção de assinaturas expiradas pelo prazo da próxima expiração
+        # (a verificação inicial arma o primeiro job)
+        get_expiry_scheduler().attach(application.job_queue, check_expired_subscriptions)
         
-        # Adicionar job para verificar assinaturas próximas de expirar (a cada 12 horas)
-        application.job_queue.run_repeating(
-            check_expiring_subscriptions,
-            interval=43200,  # 12 horas
-            first=60  # Primeira verificação após 1 minuto
-        )
+        # Avisos de expiração (72h/48h/24h) disparados no horário exato de cada assinatura
+        get_reminder_wheel().attach(application.job_queue, send_expiry_reminders)
+        
+        # Estoque de links de convite por grupo VIP (não usado no modo pedido de entrada)
+        if get_access_mode(config) == 'invite_links':
+            get_invite_pool(config).attach(application.job_queue)
+        
+        # Monitor único dos PIX automáticos pendentes
+        get_payment_watcher().attach(application.job_queue, check_payment, handle_payment_update)
         
         # Adicionar handlers
         application.add_handler(CommandHandler("start", start))
@@ -2069,12 +1865,23 @@ def main():
         application.add_handler(CallbackQueryHandler(handle_payment_method, pattern="^pix_"))
         application.add_handler(CallbackQueryHandler(check_payment_manual, pattern="^check_"))
         
+        application.add_handler(CallbackQueryHandler(handle_broadcast_control, pattern="^broadcast_(pause|resume|cancel)_\\d+$"))
+        
         # Handler geral de admin (menos específico por último)
         application.add_handler(CallbackQueryHandler(handle_admin_callback, pattern="^admin_"))
         
         # Handler de texto para edições
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_admin_text))
         
+        # Mudanças do próprio bot nos grupos (adicionado, removido, permissões)
+        application.add_handler(ChatMemberHandler(handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
+        
+        # Entradas e saídas de membros nos grupos VIP
+        application.add_handler(ChatMemberHandler(handle_chat_member, ChatMemberHandler.CHAT_MEMBER))
+        
+        # Pedidos de entrada nos grupos VIP (modo join_request)
+        application.add_handler(ChatJoinRequestHandler(handle_join_request))
+        
         # Adicionar handler de erro
         application.add_error_handler(error_handler)
         
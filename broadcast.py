@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+import persistence
+from outbound import PRIORITY_BROADCAST
+from storage import get_storage
+from subscription_index import get_subscription_index
+
+logger = logging.getLogger(__name__)
+
+RUNNING = 'running'
+PAUSED = 'paused'
+DONE = 'done'
+CANCELLED = 'cancelled'
+
+# Usuários lidos por página; o progresso é gravado ao fim de cada página
+PAGE_SIZE = 200
+
+# Envios simultâneos (o ritmo real é dado pela fila de saída)
+MAX_CONCURRENT = 20
+
+# Tentativas por destinatário em erros temporários (RetryAfter já é repetido
+# pela fila de saída)
+MAX_ATTEMPTS = 3
+
+# Intervalo mínimo entre atualizações da mensagem de progresso (segundos)
+PROGRESS_INTERVAL = 5.0
+
+
+def audience_label(audience):
+    return 'Todos os usuários' if audience == 'all' else 'Usuários VIP'
+
+
+def progress_text(job):
+    if job['status'] == DONE:
+        return (
+            f"📢 Broadcast concluído!\n\n"
+            f"✅ Mensagens enviadas: {job['sent']}\n"
+            f"❌ Erros: {job['failed']}\n\n"
+            f"Tipo: {audience_label(job['audience'])}"
+        )
+    header = {
+        RUNNING: f"📢 Enviando mensagem para {job['total']} usuários...",
+        PAUSED: f"⏸️ Broadcast pausado ({job['total']} usuários)",
+        CANCELLED: f"⏹️ Broadcast cancelado ({job['total']} usuários)"
+    }[job['status']]
+    return f"{header}\n✅ Enviados: {job['sent']}\n❌ Erros: {job['failed']}"
+
+
+def progress_markup(job):
+    if job['status'] == RUNNING:
+        buttons = [
+            InlineKeyboardButton("⏸️ Pausar", callback_data=f"broadcast_pause_{job['id']}"),
+            InlineKeyboardButton("⏹️ Cancelar", callback_data=f"broadcast_cancel_{job['id']}")
+        ]
+    elif job['status'] == PAUSED:
+        buttons = [
+            InlineKeyboardButton("▶️ Retomar", callback_data=f"broadcast_resume_{job['id']}"),
+            InlineKeyboardButton("⏹️ Cancelar", callback_data=f"broadcast_cancel_{job['id']}")
+        ]
+    else:
+        return None
+    return InlineKeyboardMarkup([buttons])
+
+
+class BroadcastEngine:
+    """Envia broadcasts em segundo plano, respeitando os limites do Telegram.
+
+    O estado de cada broadcast (contadores e último usuário processado) fica
+    na tabela broadcasts, então um broadcast pausado, ou interrompido por um
+    reinício, continua de onde parou.
+    """
+
+    def __init__(self, storage, subscription_index):
+        self._storage = storage
+        self._index = subscription_index
+        self._bot = None
+        self._tasks = {}
+        self._stop_requests = {}
+
+    def attach(self, bot):
+        self._bot = bot
+
+    async def _count_recipients(self, audience):
+        user_ids = await persistence.read(self._storage.list_user_ids)
+        if audience == 'all':
+            return len(user_ids)
+        active_vip_users = self._index.active_user_ids()
+        return sum(1 for user_id in user_ids if user_id in active_vip_users)
+
+    async def start(self, audience, text, admin_chat_id):
+        """Cria o broadcast, envia a mensagem de progresso e inicia o envio"""
+        total = await self._count_recipients(audience)
+        job = await persistence.write(self._storage.create_broadcast, audience, text, total, admin_chat_id)
+        progress_message = await self._bot.send_message(
+            chat_id=admin_chat_id,
+            text=progress_text(job),
+            reply_markup=progress_markup(job)
+        )
+        job['progress_message_id'] = progress_message.message_id
+        await persistence.write(self._storage.update_broadcast, job['id'], progress_message_id=progress_message.message_id)
+        self._spawn(job['id'])
+        logger.info(f"Broadcast {job['id']} iniciado para {total} usuários ({job['audience']})")
+        return job
+
+    def _spawn(self, broadcast_id):
+        if broadcast_id in self._tasks:
+            return
+        self._stop_requests.pop(broadcast_id, None)
+        task = asyncio.get_running_loop().create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    def is_running(self, broadcast_id):
+        return broadcast_id in self._tasks
+
+    async def pause(self, broadcast_id):
+        return await self._request_stop(broadcast_id, PAUSED)
+
+    async def cancel(self, broadcast_id):
+        return await self._request_stop(broadcast_id, CANCELLED)
+
+    async def _request_stop(self, broadcast_id, status):
+        job = await persistence.read(self._storage.get_broadcast, broadcast_id)
+        if not job or job['status'] not in (RUNNING, PAUSED):
+            return False
+        if broadcast_id in self._tasks:
+            # A tarefa encerra ao fim da página atual e grava o novo status
+            self._stop_requests[broadcast_id] = status
+        else:
+            job['status'] = status
+            await persistence.write(self._storage.update_broadcast, broadcast_id, status=status)
+            await self._show_progress(job)
+        return True
+
+    async def resume(self, broadcast_id):
+        job = await persistence.read(self._storage.get_broadcast, broadcast_id)
+        if not job or job['status'] != PAUSED:
+            return False
+        await persistence.write(self._storage.update_broadcast, broadcast_id, status=RUNNING)
+        self._spawn(broadcast_id)
+        return True
+
+    async def resume_interrupted(self):
+        """Retoma os broadcasts que estavam em andamento quando o bot parou"""
+        jobs = await persistence.read(self._storage.list_broadcasts, (RUNNING,))
+        for job in jobs:
+            logger.info(f"Retomando broadcast {job['id']} ({job['sent'] + job['failed']}/{job['total']})")
+            self._spawn(job['id'])
+
+    async def _send(self, text, user_id, semaphore):
+        async with semaphore:
+            for attempt in range(MAX_ATTEMPTS):
+                try:
+                    # Menor prioridade: liberações e respostas passam na frente
+                    await self._bot.send_message(chat_id=user_id, text=text, rate_limit_args=PRIORITY_BROADCAST)
+                    return True
+                except (Forbidden, BadRequest) as e:
+                    # Usuário bloqueou o bot ou chat inexistente: não adianta repetir
+                    logger.debug(f"Broadcast não entregue para {user_id}: {e}")
+                    return False
+                except RetryAfter as e:
+                    # A fila de saída já esgotou as novas tentativas
+                    logger.error(f"Broadcast não entregue para {user_id} após RetryAfter: {e}")
+                    return False
+                except TelegramError as e:
+                    logger.error(f"Erro ao enviar mensagem para {user_id}: {e}")
+                    await asyncio.sleep(2 ** attempt)
+            return False
+
+    async def _run(self, broadcast_id):
+        job = await persistence.read(self._storage.get_broadcast, broadcast_id)
+        if not job:
+            return
+        job['status'] = RUNNING
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+        last_progress = time.monotonic()
+        # Destinatários VIP calculados uma vez por execução (não a cada página)
+        active_vip_users = self._index.active_user_ids() if job['audience'] != 'all' else None
+
+        try:
+            while True:
+                stop_status = self._stop_requests.pop(broadcast_id, None)
+                if stop_status:
+                    job['status'] = stop_status
+                    break
+
+                page = await persistence.read(self._storage.list_user_ids_after, job['last_user_id'], PAGE_SIZE)
+                if not page:
+                    job['status'] = DONE
+                    break
+
+                if active_vip_users is None:
+                    recipients = page
+                else:
+                    recipients = [user_id for user_id in page if user_id in active_vip_users]
+
+                results = await asyncio.gather(*(self._send(job['text'], user_id, semaphore) for user_id in recipients))
+                job['sent'] += sum(results)
+                job['failed'] += len(results) - sum(results)
+                job['last_user_id'] = page[-1]
+                await persistence.write(
+                    self._storage.update_broadcast, broadcast_id,
+                    sent=job['sent'], failed=job['failed'], last_user_id=job['last_user_id']
+                )
+
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    await self._show_progress(job)
+        except Exception as e:
+            logger.error(f"Erro no broadcast {broadcast_id}: {e}")
+            job['status'] = PAUSED
+
+        await persistence.write(self._storage.update_broadcast, broadcast_id, status=job['status'])
+        await self._show_progress(job)
+        logger.info(f"Broadcast {broadcast_id} {job['status']}: {job['sent']} enviados, {job['failed']} erros")
+
+    async def _show_progress(self, job):
+        if not job.get('admin_chat_id') or not job.get('progress_message_id'):
+            return
+        try:
+            await self._bot.edit_message_text(
+                chat_id=job['admin_chat_id'],
+                message_id=job['progress_message_id'],
+                text=progress_text(job),
+                reply_markup=progress_markup(job)
+            )
+        except BadRequest as e:
+            # "Message is not modified" quando nada mudou desde a última edição
+            logger.debug(f"Progresso do broadcast {job['id']} não atualizado: {e}")
+        except TelegramError as e:
+            logger.error(f"Erro ao atualizar progresso do broadcast {job['id']}: {e}")
+
+
+# Instância global do motor de broadcast
+_broadcast_engine = None
+
+def get_broadcast_engine():
+    global _broadcast_engine
+    if _broadcast_engine is None:
+        _broadcast_engine = BroadcastEngine(get_storage(), get_subscription_index())
+    return _broadcast_engine
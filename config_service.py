@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = 'config.json'
+
+# Intervalo mínimo entre verificações de mtime/tamanho do arquivo (segundos)
+CHECK_INTERVAL = 1.0
+
+
+class ConfigError(Exception):
+    """Estrutura inválida no config.json"""
+
+
+def _freeze(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return copy.copy(value)
+
+
+def validate_config(config):
+    """Verifica a estrutura mínima do config"""
+    if 'payment_methods' not in config:
+        raise ConfigError("Estrutura payment_methods não encontrada no config")
+    if 'pix_automatico' not in config['payment_methods']:
+        raise ConfigError("pix_automatico não encontrado no config")
+    if 'pix_manual' not in config['payment_methods']:
+        raise ConfigError("pix_manual não encontrado no config")
+
+
+class ConfigSnapshot(Mapping):
+    """Cópia imutável e validada do config.json"""
+
+    def __init__(self, data, version):
+        self._data = _freeze(data)
+        self.version = version
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"ConfigSnapshot(version={self.version})"
+
+    def to_dict(self):
+        """Retorna uma cópia mutável para edição"""
+        return _thaw(self._data)
+
+
+class ConfigService:
+    """Mantém o snapshot do config em cache e só relê quando o arquivo muda."""
+
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._signature = None
+        self._version = 0
+        self._last_check = 0.0
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _reload(self, signature):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        validate_config(data)
+        self._version += 1
+        self._snapshot = ConfigSnapshot(data, self._version)
+        self._signature = signature
+        logger.info(f"Config carregada com sucesso (versão {self._version})")
+
+    def get(self):
+        """Retorna o snapshot atual ou None se o config não puder ser carregado"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._last_check < CHECK_INTERVAL:
+            return snapshot
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                signature = self._file_signature()
+                if self._snapshot is None or signature != self._signature:
+                    self._reload(signature)
+            except ConfigError as e:
+                logger.error(e)
+                if self._snapshot is None:
+                    return None
+            except Exception as e:
+                logger.error(f"Erro ao carregar {self.path}: {e}")
+                if self._snapshot is None:
+                    return None
+            return self._snapshot
+
+    @property
+    def version(self):
+        return self._version
+
+    def save(self, config):
+        """Salva o config de forma atômica e publica um novo snapshot"""
+        if isinstance(config, ConfigSnapshot):
+            config = config.to_dict()
+        validate_config(config)
+        with self._lock:
+            # Primeiro salva em um arquivo temporário
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Se salvou com sucesso, renomeia para o arquivo original
+            os.replace(temp_file, self.path)
+            self._version += 1
+            self._snapshot = ConfigSnapshot(config, self._version)
+            self._signature = self._file_signature()
+            self._last_check = time.monotonic()
+
+    def invalidate(self):
+        """Força a releitura do arquivo na próxima chamada"""
+        with self._lock:
+            self._signature = None
+            self._last_check = 0.0
+
+
+# Instância global do serviço
+_config_service = ConfigService(CONFIG_FILE)
+
+def get_config_service():
+    return _config_service
+
+# Carregar configurações (snapshot imutável)
+def load_config():
+    return _config_service.get()
+
+# Carregar uma cópia mutável das configurações para edição
+def load_config_for_update():
+    snapshot = _config_service.get()
+    return snapshot.to_dict() if snapshot is not None else None
+
+# Salvar configurações
+def save_config(config):
+    try:
+        _config_service.save(config)
+        logger.info("Configuração salva com sucesso")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao salvar {_config_service.path}: {e}")
+        return False
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+from group_registry import get_group_registry
+from membership import get_membership_index
+from outbound import PRIORITY_NOTICE
+from plan_catalog import get_plan_catalog
+from subscription_index import get_subscription_index
+from user_stats import get_user_stats_writer
+
+logger = logging.getLogger(__name__)
+
+# Assinaturas processadas por lote (um único update de status VIP por lote)
+BATCH_SIZE = 200
+
+# Remoções simultâneas no total e em cada grupo
+MAX_CONCURRENT = 20
+PER_GROUP_CONCURRENCY = 5
+
+
+class ExpiryExecutor:
+    """Remove dos grupos, em lote, os usuários com assinatura expirada.
+
+    As remoções (ban + unban) rodam em paralelo, limitadas no total e por
+    grupo; os RetryAfter são tratados pela fila de saída, que pausa o grupo
+    e repete a chamada. O status VIP dos usuários de cada lote é gravado de
+    uma vez.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, max_concurrent=MAX_CONCURRENT,
+                 per_group_concurrency=PER_GROUP_CONCURRENCY):
+        self.batch_size = batch_size
+        self.max_concurrent = max_concurrent
+        self.per_group_concurrency = per_group_concurrency
+
+    async def run(self, bot, expired_subscriptions):
+        """Processa as assinaturas expiradas e retorna o resumo da execução"""
+        started = time.monotonic()
+        summary = {
+            'subscriptions': len(expired_subscriptions),
+            'removed': 0,
+            'failed': 0,
+            'skipped': 0,
+            'not_member': 0,
+            'notified': 0,
+            'vip_revoked': 0,
+            'elapsed': 0.0
+        }
+        state = {
+            'semaphore': asyncio.Semaphore(self.max_concurrent),
+            'group_semaphores': {}
+        }
+
+        for start in range(0, len(expired_subscriptions), self.batch_size):
+            batch = expired_subscriptions[start:start + self.batch_size]
+            await self._run_batch(bot, batch, summary, state)
+
+        summary['elapsed'] = round(time.monotonic() - started, 2)
+        logger.info(
+            f"Expiração concluída: {summary['subscriptions']} assinaturas, {summary['removed']} remoções, "
+            f"{summary['failed']} falhas, {summary['skipped']} grupos ignorados, "
+            f"{summary['not_member']} grupos onde o usuário já não estava, "
+            f"{summary['notified']} usuários avisados em {summary['elapsed']}s"
+        )
+        return summary
+
+    async def _run_batch(self, bot, batch, summary, state):
+        plan_catalog = get_plan_catalog()
+        registry = get_group_registry()
+        membership = get_membership_index()
+
+        removals = []
+        expired_users = []
+        for sub in batch:
+            plan = plan_catalog.get(sub['plan_id'])
+            if not plan:
+                logger.warning(f"Plano {sub['plan_id']} da assinatura {sub['id']} não encontrado")
+                continue
+            expired_users.append((sub, plan))
+            for group_id in dict.fromkeys(str(group_id) for group_id in plan['groups']):
+                # Só remove de onde o usuário está (ou de onde ainda não foi observado)
+                if membership.is_member(group_id, sub['user_id']) is False:
+                    summary['not_member'] += 1
+                    continue
+                group_info = await registry.get(bot, group_id)
+                if not group_info['error'] and not group_info['can_restrict_members']:
+                    logger.error(f"Usuário {sub['user_id']} não removido do grupo {group_id}: bot sem permissão para banir usuários")
+                    summary['skipped'] += 1
+                    continue
+                removals.append(self._remove(bot, group_id, sub['user_id'], summary, state))
+
+        await asyncio.gather(*removals)
+
+        # Um único update de status VIP para o lote (quem renovou continua VIP)
+        subscription_index = get_subscription_index()
+        user_ids = {sub['user_id'] for sub, _ in expired_users if not subscription_index.get_active(sub['user_id'])}
+        if user_ids:
+            await get_user_stats_writer().set_vip_many(user_ids, False)
+            summary['vip_revoked'] += len(user_ids)
+
+        await asyncio.gather(*(self._notify(bot, sub, plan, summary, state) for sub, plan in expired_users))
+
+    async def _call(self, group_id, call, state):
+        """Executa a chamada respeitando o limite total e o do grupo"""
+        group_semaphore = state['group_semaphores'].setdefault(group_id, asyncio.Semaphore(self.per_group_concurrency))
+        async with state['semaphore'], group_semaphore:
+            return await call()
+
+    async def _remove(self, bot, group_id, user_id, summary, state):
+        try:
+            await self._call(group_id, lambda: bot.ban_chat_member(
+                chat_id=group_id, user_id=user_id, rate_limit_args=PRIORITY_NOTICE
+            ), state)
+            # Desbanir imediatamente para permitir reentrada
+            await self._call(group_id, lambda: bot.unban_chat_member(
+                chat_id=group_id, user_id=user_id, rate_limit_args=PRIORITY_NOTICE
+            ), state)
+            summary['removed'] += 1
+            logger.info(f"Usuário {user_id} removido do grupo {group_id}")
+        except Exception as e:
+            summary['failed'] += 1
+            logger.error(f"Erro ao remover usuário {user_id} do grupo {group_id}: {e}")
+
+    async def _notify(self, bot, sub, plan, summary, state):
+        try:
+            async with state['semaphore']:
+                await bot.send_message(
+                    chat_id=sub['user_id'],
+                    text=f"⚠️ Sua assinatura VIP expirou!\n\n"
+                         f"Plano: {plan['name']}\n"
+                         f"Data de expiração: {sub['end_date']}\n\n"
+                         f"Para continuar com acesso VIP, adquira um novo plano usando /start",
+                    rate_limit_args=PRIORITY_NOTICE
+                )
+            summary['notified'] += 1
+            logger.info(f"Notificação de expiração enviada para usuário {sub['user_id']}")
+        except Exception as e:
+            logger.error(f"Erro ao notificar usuário {sub['user_id']}: {e}")
+
+
+# Instância global do executor de expirações
+_expiry_executor = None
+
+def get_expiry_executor():
+    global _expiry_executor
+    if _expiry_executor is None:
+        _expiry_executor = ExpiryExecutor()
+    return _expiry_executor
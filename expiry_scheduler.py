@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+from subscription_index import get_subscription_index
+
+logger = logging.getLogger(__name__)
+
+# Folga após o prazo para garantir que a assinatura já conste como expirada
+DEADLINE_SLACK = 0.5
+
+# Atraso máximo de um agendamento (re-arma mesmo sem expirações, para
+# tolerar ajustes de relógio)
+MAX_DELAY = 6 * 3600
+
+# Espera antes de tentar de novo após uma verificação que falhou (as
+# assinaturas vencidas continuam no início da lista)
+RETRY_DELAY = 60
+
+
+class ExpiryScheduler:
+    """Mantém um único job run_once apontando para a próxima expiração.
+
+    O prazo vem da lista ordenada de expirações do SubscriptionIndex, então
+    cada execução só processa as assinaturas que realmente venceram.
+    """
+
+    JOB_NAME = 'expiry_scheduler'
+
+    def __init__(self, subscription_index):
+        self._index = subscription_index
+        self._lock = threading.Lock()
+        self._job_queue = None
+        self._callback = None
+        self._job = None
+        self._deadline = None
+        self._retry_at = 0.0
+
+    def attach(self, job_queue, callback):
+        """Define o JobQueue e a função chamada no prazo (recebe o context do job)"""
+        self._job_queue = job_queue
+        self._callback = callback
+
+    async def _run(self, context):
+        with self._lock:
+            self._job = None
+            self._deadline = None
+            self._retry_at = 0.0
+        await self._callback(context)
+
+    def arm(self, retry_delay=None):
+        """(Re)agenda o job para a próxima expiração, se ela mudou.
+
+        retry_delay: a execução atual falhou; a próxima não roda antes desse
+        intervalo, mesmo que a expiração mais antiga já tenha passado.
+        """
+        if self._job_queue is None:
+            return
+
+        next_expiry = self._index.next_expiry()
+        now = time.time()
+        if next_expiry is None:
+            deadline = now + MAX_DELAY
+        else:
+            deadline = min(next_expiry + DEADLINE_SLACK, now + MAX_DELAY)
+
+        with self._lock:
+            if retry_delay:
+                self._retry_at = now + retry_delay
+            # Depois de uma falha, não re-arma em 0s enquanto o prazo continua vencido
+            deadline = max(deadline, self._retry_at)
+
+            if self._job is not None and self._deadline is not None and self._deadline <= deadline:
+                # O job atual já dispara antes (ou no mesmo prazo)
+                return
+            if self._job is not None:
+                self._job.schedule_removal()
+
+            delay = max(0.0, deadline - now)
+            self._deadline = deadline
+            self._job = self._job_queue.run_once(self._run, when=delay, name=self.JOB_NAME)
+
+        logger.debug(f"Próxima verificação de expiração em {delay:.0f}s")
+
+
+# Instância global do agendador
+_expiry_scheduler = None
+
+def get_expiry_scheduler():
+    global _expiry_scheduler
+    if _expiry_scheduler is None:
+        _expiry_scheduler = ExpiryScheduler(get_subscription_index())
+    return _expiry_scheduler
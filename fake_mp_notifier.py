@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Notificador falso do Mercado Pago para testes locais.
+
+Envia uma notificação de pagamento assinada (x-signature) para o endpoint
+/webhook/mercadopago do servidor local, como o Mercado Pago faria.
+
+Uso:
+    python fake_mp_notifier.py 123456789
+    python fake_mp_notifier.py 123456789 --url http://localhost:8080/webhook/mercadopago --repeat 3
+"""
+import argparse
+import time
+import uuid
+
+import requests
+
+from config_service import load_config
+from payment_notifications import sign_notification
+
+
+def send_notification(url, secret, payment_id, action='payment.updated', notification_id=None, request_id=None):
+    request_id = request_id or str(uuid.uuid4())
+    ts = str(int(time.time()))
+    body = {
+        "id": notification_id or int(time.time() * 1000),
+        "action": action,
+        "type": "payment",
+        "live_mode": False,
+        "date_created": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "data": {"id": str(payment_id)}
+    }
+    headers = {
+        'x-request-id': request_id,
+        'x-signature': sign_notification(secret, payment_id, request_id, ts)
+    }
+    return requests.post(
+        url,
+        params={'data.id': str(payment_id), 'type': 'payment'},
+        json=body,
+        headers=headers,
+        timeout=10
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia notificações falsas do Mercado Pago")
+    parser.add_argument('payment_id', help="ID do pagamento notificado")
+    parser.add_argument('--url', default='http://localhost:8080/webhook/mercadopago')
+    parser.add_argument('--secret', help="Chave do webhook (padrão: mercadopago.webhook_secret do config.json)")
+    parser.add_argument('--action', default='payment.updated')
+    parser.add_argument('--repeat', type=int, default=1, help="Reenvia a mesma notificação (testa a deduplicação)")
+    args = parser.parse_args()
+
+    secret = args.secret
+    if not secret:
+        config = load_config()
+        secret = (config or {}).get('mercadopago', {}).get('webhook_secret')
+    if not secret:
+        parser.error("webhook_secret não configurado; use --secret")
+
+    notification_id = int(time.time() * 1000)
+    request_id = str(uuid.uuid4())
+    for _ in range(args.repeat):
+        started = time.monotonic()
+        response = send_notification(args.url, secret, args.payment_id, args.action, notification_id, request_id)
+        elapsed = (time.monotonic() - started) * 1000
+        print(f"{response.status_code} {response.text.strip()} ({elapsed:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import persistence
+from storage import get_storage
+from subscription_index import get_subscription_index
+
+logger = logging.getLogger(__name__)
+
+CLAIMED = 'claimed'
+FULFILLED = 'fulfilled'
+FAILED = 'failed'
+
+
+class FulfillmentLedger:
+    """Registro de liberações por payment_id (reservado -> liberado).
+
+    O estado de cada pagamento fica em memória para a verificação em O(1);
+    a reserva é feita no loop do bot antes de qualquer await, então duas
+    aprovações simultâneas do mesmo pagamento não passam juntas. A tabela
+    fulfillments (payment_id único) mantém o registro entre reinícios.
+    """
+
+    def __init__(self, storage, subscription_index):
+        self._storage = storage
+        self._index = subscription_index
+        self._states = {}
+
+    def load(self):
+        backfilled = self._storage.backfill_fulfillments()
+        if backfilled:
+            logger.info(f"{backfilled} pagamentos de assinaturas existentes registrados como liberados")
+        self._states = self._storage.list_fulfillment_states()
+        self._recover()
+        logger.info(f"Registro de liberações carregado: {len(self._states)} pagamentos")
+
+    def _recover(self):
+        # Reservas interrompidas (ex.: queda do bot no meio da liberação)
+        for payment_id, status in list(self._states.items()):
+            if status != CLAIMED:
+                continue
+            success = self._index.get_by_payment(payment_id) is not None
+            self._storage.finish_fulfillment(payment_id, success)
+            self._states[payment_id] = FULFILLED if success else FAILED
+            logger.warning(
+                f"Liberação interrompida do pagamento {payment_id} marcada como "
+                f"{'liberada' if success else 'falha'}"
+            )
+
+    def state(self, payment_id):
+        return self._states.get(str(payment_id))
+
+    def is_fulfilled(self, payment_id):
+        return self._states.get(str(payment_id)) == FULFILLED
+
+    async def claim(self, payment_id, user_id=None, plan_id=None):
+        """Reserva o pagamento. Retorna False se ele já está reservado ou liberado"""
+        payment_id = str(payment_id)
+        previous = self._states.get(payment_id)
+        if previous in (CLAIMED, FULFILLED):
+            return False
+
+        # Reserva em memória antes do primeiro await
+        self._states[payment_id] = CLAIMED
+        try:
+            claimed = await persistence.write(self._storage.claim_fulfillment, payment_id, user_id, plan_id)
+        except Exception:
+            self._restore(payment_id, previous)
+            raise
+        if not claimed:
+            logger.warning(f"Pagamento {payment_id} já reservado no banco")
+        return claimed
+
+    async def finish(self, payment_id, success=True):
+        payment_id = str(payment_id)
+        await persistence.write(self._storage.finish_fulfillment, payment_id, success)
+        self._states[payment_id] = FULFILLED if success else FAILED
+
+    def _restore(self, payment_id, previous):
+        if previous is None:
+            self._states.pop(payment_id, None)
+        else:
+            self._states[payment_id] = previous
+
+
+# Instância global do registro de liberações
+_fulfillment_ledger = None
+
+def get_fulfillment_ledger():
+    global _fulfillment_ledger
+    if _fulfillment_ledger is None:
+        _fulfillment_ledger = FulfillmentLedger(get_storage(), get_subscription_index())
+        _fulfillment_ledger.load()
+    return _fulfillment_ledger
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+from telegram import ChatMember
+
+from config_service import load_config
+from outbound import PRIORITY_NOTICE, priority_kwargs
+from plan_catalog import get_plan_catalog
+
+logger = logging.getLogger(__name__)
+
+# Validade das informações de um grupo (segundos)
+DEFAULT_TTL = 3600
+
+# Validade menor para grupos cuja consulta falhou
+ERROR_TTL = 60
+
+GROUP_TYPES = ('group', 'supergroup')
+
+# Permissões do bot usadas pelo fluxo VIP
+RIGHT_LABELS = {
+    'can_invite_users': 'convidar usuários',
+    'can_restrict_members': 'banir usuários'
+}
+
+
+def _member_rights(member):
+    """Permissões do bot a partir do ChatMember dele no grupo"""
+    if member is None:
+        return {'is_admin': False, 'can_invite_users': False, 'can_restrict_members': False}
+    if member.status == ChatMember.OWNER:
+        return {'is_admin': True, 'can_invite_users': True, 'can_restrict_members': True}
+    if member.status == ChatMember.ADMINISTRATOR:
+        return {
+            'is_admin': True,
+            'can_invite_users': bool(member.can_invite_users),
+            'can_restrict_members': bool(member.can_restrict_members)
+        }
+    return {'is_admin': False, 'can_invite_users': False, 'can_restrict_members': False}
+
+
+def missing_rights(info, *rights):
+    """Permissões (em texto) que faltam ao bot no grupo"""
+    return [RIGHT_LABELS.get(right, right) for right in rights if not info.get(right)]
+
+
+class GroupRegistry:
+    """Tipo, título e permissões do bot em cada grupo VIP, com validade.
+
+    Aquecido na inicialização para todos os grupos dos planos e atualizado
+    pelos updates my_chat_member, então a liberação e a expiração não
+    precisam consultar o grupo a cada uso. Consultas simultâneas do mesmo
+    grupo compartilham uma única requisição.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._groups = {}
+        self._inflight = {}
+
+    def _fresh(self, info, now):
+        ttl = ERROR_TTL if info.get('error') else self.ttl
+        return now - info['fetched_at'] < ttl
+
+    def cached(self, group_id):
+        return self._groups.get(str(group_id))
+
+    async def get(self, bot, group_id, refresh=False):
+        """Retorna as informações do grupo, consultando a API só quando vencidas"""
+        group_id = str(group_id)
+        info = self._groups.get(group_id)
+        if info is not None and not refresh and self._fresh(info, time.monotonic()):
+            return info
+
+        task = self._inflight.get(group_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(bot, group_id))
+            self._inflight[group_id] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, bot, group_id):
+        priority = priority_kwargs(bot, PRIORITY_NOTICE)
+        try:
+            chat = await bot.get_chat(group_id, **priority)
+            member = await bot.get_chat_member(group_id, bot.id, **priority)
+            info = self._store(group_id, chat.type, chat.title, _member_rights(member))
+        except Exception as e:
+            logger.error(f"Erro ao consultar o grupo {group_id}: {e}")
+            info = self._store(group_id, None, None, _member_rights(None), error=str(e))
+        finally:
+            self._inflight.pop(group_id, None)
+        return info
+
+    def _store(self, group_id, chat_type, title, rights, error=None):
+        info = {
+            'group_id': group_id,
+            'type': chat_type,
+            'title': title,
+            'error': error,
+            'fetched_at': time.monotonic(),
+            **rights
+        }
+        self._groups[group_id] = info
+        return info
+
+    def update_from_member(self, chat, member):
+        """Atualiza o grupo a partir de um update my_chat_member (sem chamar a API)"""
+        info = self._store(str(chat.id), chat.type, chat.title, _member_rights(member))
+        logger.info(
+            f"Permissões do bot no grupo {chat.id} atualizadas: "
+            f"admin={info['is_admin']}, convites={info['can_invite_users']}, banir={info['can_restrict_members']}"
+        )
+        return info
+
+    async def warm(self, bot, group_ids=None):
+        """Consulta todos os grupos dos planos (na inicialização)"""
+        if group_ids is None:
+            group_ids = get_plan_catalog(load_config()).group_ids()
+        infos = await asyncio.gather(*(self.get(bot, group_id, refresh=True) for group_id in group_ids))
+        logger.info(f"Informações de {len(infos)} grupos VIP carregadas")
+        return infos
+
+    def problems(self):
+        """{group_id: descrição} dos grupos que o bot não consegue administrar"""
+        problems = {}
+        for group_id, info in self._groups.items():
+            if info['error']:
+                problems[group_id] = info['error']
+            elif info['type'] not in GROUP_TYPES:
+                problems[group_id] = f"não é um grupo ou supergrupo (tipo: {info['type']})"
+            else:
+                missing = missing_rights(info, *RIGHT_LABELS)
+                if missing:
+                    problems[group_id] = f"bot sem permissão para {', '.join(missing)}"
+        return problems
+
+
+# Instância global do registro de grupos
+_group_registry = None
+
+def get_group_registry():
+    global _group_registry
+    if _group_registry is None:
+        _group_registry = GroupRegistry()
+    return _group_registry
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+
+import persistence
+from config_service import load_config
+from group_registry import GROUP_TYPES, get_group_registry, missing_rights
+from outbound import PRIORITY_FULFILLMENT, PRIORITY_NOTICE, priority_kwargs
+from plan_catalog import get_plan_catalog
+from storage import DATE_FORMAT, get_storage
+
+logger = logging.getLogger(__name__)
+
+# Links prontos mantidos por grupo
+DEFAULT_POOL_SIZE = 3
+
+# Validade dos links criados (o usuário tem esse prazo para entrar)
+LINK_TTL = timedelta(days=7)
+
+# Links com menos validade que isso são revogados e substituídos na reposição
+ROTATE_BEFORE = timedelta(days=1)
+
+# Intervalo da reposição periódica (segundos)
+REFILL_INTERVAL = 600
+
+# Grupos processados ao mesmo tempo em uma liberação
+MAX_CONCURRENT_GROUPS = 5
+
+
+class InvitePool:
+    """Links de convite de uso único pré-gerados para cada grupo VIP.
+
+    A liberação só retira um link pronto da fila do grupo; a reposição roda
+    em segundo plano pelo JobQueue, criando links até pool_size por grupo e
+    revogando os que estão perto de expirar. Os links ficam na tabela
+    invite_links, então o estoque sobrevive a reinícios.
+    """
+
+    JOB_NAME = 'invite_pool_refill'
+
+    def __init__(self, storage, pool_size=DEFAULT_POOL_SIZE):
+        self._storage = storage
+        self.pool_size = pool_size
+        self._links = {}
+        self._job_queue = None
+        self._refill_pending = False
+        self._refill_lock = None
+
+    @classmethod
+    def from_config(cls, storage, config):
+        settings = (config or {}).get('invite_pool', {})
+        return cls(storage, pool_size=settings.get('size', DEFAULT_POOL_SIZE))
+
+    def load(self):
+        self._links = {}
+        for row in self._storage.list_ready_invite_links():
+            expire_date = datetime.strptime(row['expire_date'], DATE_FORMAT)
+            self._links.setdefault(row['group_id'], deque()).append((row['invite_link'], expire_date))
+        logger.info(f"Estoque de convites carregado: {sum(len(links) for links in self._links.values())} links")
+
+    def attach(self, job_queue):
+        """Agenda a reposição periódica (a primeira roda logo após iniciar)"""
+        self._job_queue = job_queue
+        job_queue.run_repeating(self._run, interval=REFILL_INTERVAL, first=1, name=self.JOB_NAME)
+
+    def available(self, group_id):
+        return len(self._links.get(str(group_id), ()))
+
+    def stats(self):
+        return {group_id: len(links) for group_id, links in self._links.items()}
+
+    async def take(self, group_id, user_id=None):
+        """Retira um link pronto do grupo. Retorna None se o estoque acabou"""
+        links = self._links.get(str(group_id))
+        min_expire = datetime.now() + ROTATE_BEFORE
+        try:
+            while links:
+                # Retirado da fila antes do await: cada link vai para um único usuário
+                invite_link, expire_date = links.popleft()
+                if expire_date < min_expire:
+                    # Perto de expirar: sai do estoque e expira sozinho
+                    await persistence.write(self._storage.revoke_invite_links, [invite_link])
+                    continue
+                if await persistence.write(self._storage.issue_invite_link, invite_link, user_id):
+                    return invite_link
+            return None
+        finally:
+            self.request_refill()
+
+    def request_refill(self):
+        """Agenda uma reposição imediata (se já não houver uma pendente)"""
+        if self._job_queue is None:
+            return
+        if self._refill_pending:
+            return
+        self._refill_pending = True
+        self._job_queue.run_once(self._run_now, when=0, name=f"{self.JOB_NAME}_now")
+
+    async def _run_now(self, context):
+        self._refill_pending = False
+        await self.refill(context.bot)
+
+    async def _run(self, context):
+        await self.refill(context.bot)
+
+    async def refill(self, bot):
+        """Revoga links perto de expirar e completa o estoque de cada grupo"""
+        if self._refill_lock is None:
+            self._refill_lock = asyncio.Lock()
+        async with self._refill_lock:
+            group_ids = get_plan_catalog(load_config()).group_ids()
+
+            # Grupos que saíram dos planos não precisam mais de links
+            for group_id in set(self._links) - set(group_ids):
+                await self._revoke(bot, group_id, list(self._links.pop(group_id)))
+
+            registry = get_group_registry()
+            for group_id in group_ids:
+                info = await registry.get(bot, group_id)
+                if not info['error'] and not info['can_invite_users']:
+                    # Sem permissão de convite não adianta tentar (o registro avisa quando mudar)
+                    continue
+                links = self._links.setdefault(group_id, deque())
+                min_expire = datetime.now() + ROTATE_BEFORE
+                stale = [link for link in links if link[1] < min_expire]
+                if stale:
+                    self._links[group_id] = links = deque(link for link in links if link[1] >= min_expire)
+                    await self._revoke(bot, group_id, stale)
+
+                created = 0
+                while len(links) < self.pool_size:
+                    expire_date = (datetime.now() + LINK_TTL).replace(microsecond=0)
+                    try:
+                        invite_link = await bot.create_chat_invite_link(
+                            chat_id=group_id,
+                            name="VIP",
+                            expire_date=expire_date,
+                            member_limit=1,
+                            creates_join_request=False,
+                            rate_limit_args=PRIORITY_NOTICE
+                        )
+                    except Exception as e:
+                        # Sem permissão ou grupo inválido: a liberação cria sob demanda
+                        logger.error(f"Erro ao gerar convites para o grupo {group_id}: {e}")
+                        break
+                    await persistence.write(
+                        self._storage.add_invite_link,
+                        invite_link.invite_link, group_id, expire_date.strftime(DATE_FORMAT)
+                    )
+                    links.append((invite_link.invite_link, expire_date))
+                    created += 1
+                if created:
+                    logger.info(f"{created} convites gerados para o grupo {group_id} ({len(links)} em estoque)")
+
+    async def _revoke(self, bot, group_id, links):
+        await persistence.write(self._storage.revoke_invite_links, [invite_link for invite_link, _ in links])
+        for invite_link, _ in links:
+            try:
+                await bot.revoke_chat_invite_link(chat_id=group_id, invite_link=invite_link, rate_limit_args=PRIORITY_NOTICE)
+            except Exception as e:
+                logger.debug(f"Convite {invite_link} não revogado no grupo {group_id}: {e}")
+        logger.info(f"{len(links)} convites revogados no grupo {group_id}")
+
+
+async def create_invite_link(bot, group_id, user_id=None):
+    """Cria o link sob demanda (estoque vazio); usa o link principal do grupo se falhar"""
+    priority = priority_kwargs(bot, PRIORITY_FULFILLMENT)
+    # Tipo e permissões vêm do registro de grupos (sem get_chat a cada liberação);
+    # se a consulta do grupo falhou, a própria criação do link mostra o erro
+    info = await get_group_registry().get(bot, group_id)
+    if not info['error']:
+        if info['type'] not in GROUP_TYPES:
+            raise ValueError(f"não é um grupo ou supergrupo válido (tipo: {info['type']})")
+        if not info['can_invite_users']:
+            raise PermissionError(f"bot sem permissão para {', '.join(missing_rights(info, 'can_invite_users'))}")
+    try:
+        invite_link = await bot.create_chat_invite_link(
+            chat_id=group_id,
+            name=f"VIP {user_id}" if user_id else f"VIP {datetime.now().strftime('%Y%m%d')}",
+            expire_date=datetime.now() + LINK_TTL,
+            member_limit=1,
+            creates_join_request=False,
+            **priority
+        )
+        return invite_link.invite_link
+    except Exception as e:
+        logger.error(f"Erro ao criar link de convite para grupo {group_id}: {e}")
+        try:
+            return await bot.export_chat_invite_link(chat_id=group_id, **priority)
+        except Exception as e2:
+            raise RuntimeError(f"{e} / link existente: {e2}") from e2
+
+
+async def issue_invite_links(bot, group_ids, user_id=None):
+    """Obtém um link para cada grupo, em paralelo e sem repetir grupos.
+
+    Retorna ({group_id: link}, {group_id: erro}), na ordem dos grupos do plano.
+    """
+    group_ids = list(dict.fromkeys(str(group_id) for group_id in group_ids))
+    pool = get_invite_pool()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_GROUPS)
+
+    async def issue(group_id):
+        async with semaphore:
+            invite_link = await pool.take(group_id, user_id)
+            if invite_link:
+                return invite_link
+            return await create_invite_link(bot, group_id, user_id)
+
+    results = await asyncio.gather(*(issue(group_id) for group_id in group_ids), return_exceptions=True)
+    links = {}
+    failures = {}
+    for group_id, result in zip(group_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Erro ao obter link para o grupo {group_id}: {result}")
+            failures[group_id] = result
+        else:
+            links[group_id] = result
+    return links, failures
+
+
+def format_invite_failures(failures, user_id=None):
+    """Alerta único para o admin com as falhas de todos os grupos"""
+    header = f"⚠️ Erro ao gerar links para o usuário {user_id}" if user_id else "⚠️ Erro ao gerar links de convite"
+    lines = [f"{header} em {len(failures)} grupo(s):"]
+    lines.extend(f"• {group_id}: {error}" for group_id, error in failures.items())
+    lines.append("\nVerifique se o bot tem permissões de administrador nos grupos.")
+    return "\n".join(lines)
+
+
+# Instância global do estoque de convites
+_invite_pool = None
+
+def get_invite_pool(config=None):
+    global _invite_pool
+    if _invite_pool is None:
+        _invite_pool = InvitePool.from_config(get_storage(), config or load_config())
+        _invite_pool.load()
+    return _invite_pool
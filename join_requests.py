@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import persistence
+from config_service import load_config
+from group_registry import get_group_registry
+from membership import is_entitled
+from outbound import PRIORITY_FULFILLMENT, PRIORITY_NOTICE
+from plan_catalog import get_plan_catalog
+from storage import get_storage
+from subscription_index import get_subscription_index
+
+logger = logging.getLogger(__name__)
+
+# Modos de acesso aos grupos VIP:
+#   invite_links  - um link de uso único por compra (estoque de convites)
+#   join_request  - um link fixo de pedido de entrada por grupo; o bot aprova
+#                   quem tem assinatura ativa com o grupo
+ACCESS_MODES = ('invite_links', 'join_request')
+
+# Chave do link de pedido de entrada de cada grupo na tabela meta
+_META_KEY = 'join_request_link:{}'
+
+
+def get_access_mode(config=None):
+    mode = (config or load_config()).get('group_access', {}).get('mode', 'invite_links')
+    if mode not in ACCESS_MODES:
+        logger.error(f"Modo de acesso inválido: {mode}; usando invite_links")
+        return 'invite_links'
+    return mode
+
+
+class JoinRequestGate:
+    """Links de pedido de entrada dos grupos VIP e a decisão sobre cada pedido.
+
+    Cada grupo tem um único link com creates_join_request=True, criado uma
+    vez e guardado na tabela meta; a compra só entrega esse link. Os pedidos
+    são aprovados ou recusados consultando as assinaturas ativas em memória.
+    """
+
+    def __init__(self, storage, subscription_index):
+        self._storage = storage
+        self._index = subscription_index
+        self._links = {}
+
+    def load(self, group_ids):
+        for group_id in group_ids:
+            invite_link = self._storage.get_meta(_META_KEY.format(group_id))
+            if invite_link:
+                self._links[str(group_id)] = invite_link
+
+    def get_link(self, group_id):
+        return self._links.get(str(group_id))
+
+    async def ensure_links(self, bot):
+        """Cria o link de pedido de entrada dos grupos que ainda não têm"""
+        group_ids = get_plan_catalog(load_config()).group_ids()
+        self.load(group_ids)
+        registry = get_group_registry()
+        for group_id in group_ids:
+            if group_id in self._links:
+                continue
+            info = await registry.get(bot, group_id)
+            if not info['error'] and not info['can_invite_users']:
+                logger.error(f"Link de pedido de entrada não criado no grupo {group_id}: bot sem permissão para convidar usuários")
+                continue
+            try:
+                invite_link = await bot.create_chat_invite_link(
+                    chat_id=group_id,
+                    name="VIP (pedido de entrada)",
+                    creates_join_request=True,
+                    rate_limit_args=PRIORITY_NOTICE
+                )
+            except Exception as e:
+                logger.error(f"Erro ao criar link de pedido de entrada no grupo {group_id}: {e}")
+                continue
+            await persistence.write(self._storage.set_meta, _META_KEY.format(group_id), invite_link.invite_link)
+            self._links[group_id] = invite_link.invite_link
+            logger.info(f"Link de pedido de entrada criado para o grupo {group_id}")
+
+    def links_for(self, group_ids):
+        """Links dos grupos (sem repetir). Retorna ({group_id: link}, {group_id: erro})"""
+        links = {}
+        failures = {}
+        for group_id in dict.fromkeys(str(group_id) for group_id in group_ids):
+            invite_link = self._links.get(group_id)
+            if invite_link:
+                links[group_id] = invite_link
+            else:
+                failures[group_id] = "grupo sem link de pedido de entrada"
+        return links, failures
+
+    async def handle(self, bot, join_request):
+        """Aprova ou recusa o pedido de entrada. Retorna True se aprovado"""
+        chat_id = join_request.chat.id
+        user_id = join_request.from_user.id
+        approved = is_entitled(user_id, chat_id, self._index)
+        if approved:
+            await bot.approve_chat_join_request(chat_id=chat_id, user_id=user_id, rate_limit_args=PRIORITY_FULFILLMENT)
+        else:
+            await bot.decline_chat_join_request(chat_id=chat_id, user_id=user_id, rate_limit_args=PRIORITY_FULFILLMENT)
+        logger.info(f"Pedido de entrada de {user_id} no grupo {chat_id} {'aprovado' if approved else 'recusado'}")
+        return approved
+
+
+# Instância global dos pedidos de entrada
+_join_request_gate = None
+
+def get_join_request_gate():
+    global _join_request_gate
+    if _join_request_gate is None:
+        _join_request_gate = JoinRequestGate(get_storage(), get_subscription_index())
+    return _join_request_gate
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config_service import load_config
+from plan_catalog import get_plan_catalog
+
+
+class KeyboardCache:
+    """Teclados dos menus de planos montados uma vez por versão do config.
+
+    Cada variante (todos os planos, todos menos o atual, métodos de
+    pagamento de um plano...) é guardada pela chave da variante; quando o
+    config muda de versão (save_config, alteração do arquivo) o cache é
+    descartado inteiro. InlineKeyboardMarkup é imutável, então a mesma
+    instância pode ser enviada em várias respostas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._markups = {}
+
+    def get(self, config, variant, build):
+        version = getattr(config, 'version', None)
+        if version is None:
+            # Cópia mutável em edição: não entra no cache
+            return build(config)
+
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._markups = {}
+            markup = self._markups.get(variant)
+        if markup is None:
+            markup = build(config)
+            with self._lock:
+                if version == self._version:
+                    markup = self._markups.setdefault(variant, markup)
+        return markup
+
+
+_keyboard_cache = KeyboardCache()
+
+
+def _config(config):
+    return config if config is not None else load_config()
+
+
+def _plan_rows(plan_catalog, exclude_plan_id=None):
+    return [
+        [InlineKeyboardButton(plan_catalog.label(plan['id']), callback_data=f"plan_{plan['id']}")]
+        for plan in plan_catalog
+        if plan['id'] != exclude_plan_id
+    ]
+
+
+def plans_markup(config=None):
+    """Todos os planos"""
+    def build(config):
+        return InlineKeyboardMarkup(_plan_rows(get_plan_catalog(config)))
+    return _keyboard_cache.get(_config(config), ('plans',), build)
+
+
+def other_plans_markup(current_plan_id, renew=False, config=None):
+    """Todos os planos menos o atual, com o botão de renovação opcional no topo"""
+    def build(config):
+        rows = _plan_rows(get_plan_catalog(config), exclude_plan_id=current_plan_id)
+        if renew:
+            rows.insert(0, [InlineKeyboardButton("🔄 Renovar Plano Atual", callback_data=f"renew_{current_plan_id}")])
+        return InlineKeyboardMarkup(rows)
+    return _keyboard_cache.get(_config(config), ('other_plans', current_plan_id, bool(renew)), build)
+
+
+def payment_methods_markup(plan_id, config=None):
+    """Métodos de pagamento habilitados para o plano"""
+    def build(config):
+        rows = []
+        if config['payment_methods']['pix_automatico']['enabled']:
+            rows.append([InlineKeyboardButton("💳 PIX Automático", callback_data=f"pix_auto_{plan_id}")])
+        if config['payment_methods']['pix_manual']['enabled']:
+            rows.append([InlineKeyboardButton("💳 PIX Manual", callback_data=f"pix_manual_{plan_id}")])
+        return InlineKeyboardMarkup(rows)
+    return _keyboard_cache.get(_config(config), ('payment_methods', plan_id), build)
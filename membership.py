@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from telegram import ChatMember
+
+import persistence
+from config_service import load_config
+from plan_catalog import get_plan_catalog
+from storage import get_storage
+from subscription_index import get_subscription_index
+
+logger = logging.getLogger(__name__)
+
+# Status em que o usuário está dentro do grupo
+PRESENT_STATUSES = (ChatMember.OWNER, ChatMember.ADMINISTRATOR, ChatMember.MEMBER, ChatMember.RESTRICTED)
+
+# Status que não exigem assinatura (administração do grupo)
+STAFF_STATUSES = (ChatMember.OWNER, ChatMember.ADMINISTRATOR)
+
+
+def is_present(member):
+    if member.status == ChatMember.RESTRICTED:
+        return bool(member.is_member)
+    return member.status in PRESENT_STATUSES
+
+
+def is_entitled(user_id, group_id, subscription_index=None):
+    """O usuário tem assinatura ativa de algum plano que dá acesso ao grupo?"""
+    plan_ids = (subscription_index or get_subscription_index()).active_plan_ids(user_id)
+    if not plan_ids:
+        return False
+    return any(plan['id'] in plan_ids for plan in get_plan_catalog().plans_for_group(group_id))
+
+
+class MembershipIndex:
+    """Quem está em cada grupo VIP, mantido pelos updates chat_member.
+
+    Cada entrada, saída ou remoção observada atualiza o índice em memória e
+    a tabela group_members. Usuários que entraram antes do bot começar a
+    observar o grupo não aparecem: para eles is_member retorna None
+    (desconhecido), não False.
+    """
+
+    def __init__(self, storage, subscription_index):
+        self._storage = storage
+        self._index = subscription_index
+        self._members = {}
+
+    def load(self):
+        self._members = {}
+        rows = self._storage.list_group_members()
+        for row in rows:
+            self._members.setdefault(row['group_id'], {})[row['user_id']] = (row['status'], row['is_bot'])
+        logger.info(f"Índice de membros carregado: {len(rows)} registros em {len(self._members)} grupos")
+
+    async def update(self, chat_member_updated):
+        """Aplica um update chat_member (entrada, saída, banimento, promoção)"""
+        group_id = str(chat_member_updated.chat.id)
+        member = chat_member_updated.new_chat_member
+        user = member.user
+        if is_present(member):
+            status = member.status
+        else:
+            status = ChatMember.BANNED if member.status == ChatMember.BANNED else ChatMember.LEFT
+        self._members.setdefault(group_id, {})[user.id] = (status, user.is_bot)
+        await persistence.write(self._storage.set_group_member, group_id, user.id, status, user.is_bot)
+        logger.debug(f"Membro {user.id} no grupo {group_id}: {status}")
+
+    def is_member(self, group_id, user_id):
+        """True/False se já observado no grupo; None se desconhecido"""
+        entry = self._members.get(str(group_id), {}).get(user_id)
+        if entry is None:
+            return None
+        return entry[0] in PRESENT_STATUSES
+
+    def members(self, group_id):
+        return [
+            user_id for user_id, (status, _) in self._members.get(str(group_id), {}).items()
+            if status in PRESENT_STATUSES
+        ]
+
+    def reconcile(self):
+        """Membros presentes nos grupos VIP sem assinatura ativa que dê acesso ao grupo.
+
+        Retorna {group_id: {'members': n, 'unentitled': [user_id, ...]}}.
+        """
+        report = {}
+        for group_id in get_plan_catalog(load_config()).group_ids():
+            members = self._members.get(group_id, {})
+            present = 0
+            unentitled = []
+            for user_id, (status, is_bot) in members.items():
+                if status not in PRESENT_STATUSES:
+                    continue
+                present += 1
+                if is_bot or status in STAFF_STATUSES:
+                    continue
+                if not is_entitled(user_id, group_id, self._index):
+                    unentitled.append(user_id)
+            report[group_id] = {'members': present, 'unentitled': sorted(unentitled)}
+        return report
+
+
+# Instância global do índice de membros
+_membership_index = None
+
+def get_membership_index():
+    global _membership_index
+    if _membership_index is None:
+        _membership_index = MembershipIndex(get_storage(), get_subscription_index())
+        _membership_index.load()
+    return _membership_index
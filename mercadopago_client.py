@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import uuid
+
+import aiohttp
+
+from config_service import load_config
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = 'https://api.mercadopago.com'
+
+# Tempo máximo de cada chamada à API (segundos)
+DEFAULT_TIMEOUT = 10
+
+# Conexões mantidas abertas com a API (keep-alive)
+POOL_SIZE = 20
+KEEPALIVE_TIMEOUT = 60
+
+
+class MercadoPagoError(Exception):
+    """Falha na chamada à API do Mercado Pago"""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class MercadoPagoClient:
+    """Cliente assíncrono da API de pagamentos do Mercado Pago.
+
+    Usa uma única sessão aiohttp com conexões keep-alive, criada no loop do
+    bot na primeira chamada. O token é lido do config a cada requisição para
+    refletir edições feitas pelo painel admin.
+    """
+
+    def __init__(self, access_token=None, timeout=DEFAULT_TIMEOUT):
+        self._access_token = access_token
+        self.timeout = timeout
+        self._session = None
+        self._session_lock = None
+
+    def _token(self):
+        if self._access_token:
+            return self._access_token
+        config = load_config()
+        if not config:
+            raise MercadoPagoError("Configuração não carregada")
+        return config['mercadopago']['access_token']
+
+    async def _get_session(self):
+        if self._session is not None and not self._session.closed:
+            return self._session
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE_TIMEOUT)
+                self._session = aiohttp.ClientSession(base_url=API_BASE_URL, connector=connector)
+        return self._session
+
+    async def _request(self, method, path, *, json=None, params=None, headers=None, timeout=None):
+        session = await self._get_session()
+        request_headers = {'Authorization': f"Bearer {self._token()}"}
+        if headers:
+            request_headers.update(headers)
+        try:
+            async with session.request(
+                method, path,
+                json=json,
+                params=params,
+                headers=request_headers,
+                timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+            ) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = None
+                if response.status >= 400:
+                    message = body.get('message') if isinstance(body, dict) else None
+                    raise MercadoPagoError(
+                        f"Mercado Pago respondeu {response.status} em {method} {path}: {message or body}",
+                        status=response.status,
+                        body=body
+                    )
+                return body
+        except asyncio.TimeoutError as e:
+            raise MercadoPagoError(f"Tempo esgotado em {method} {path}") from e
+        except aiohttp.ClientError as e:
+            raise MercadoPagoError(f"Erro de conexão em {method} {path}: {e}") from e
+
+    async def create_pix_payment(self, amount, description, external_reference, payer=None, timeout=None):
+        """Cria um pagamento PIX e retorna o pagamento completo (com point_of_interaction)"""
+        payment_data = {
+            "transaction_amount": float(amount),
+            "description": description,
+            "payment_method_id": "pix",
+            "external_reference": external_reference,
+            "payer": payer or {
+                "email": "cliente@email.com",
+                "first_name": "Cliente",
+                "last_name": "Teste"
+            }
+        }
+        return await self._request(
+            'POST', '/v1/payments',
+            json=payment_data,
+            headers={'X-Idempotency-Key': str(uuid.uuid4())},
+            timeout=timeout
+        )
+
+    async def get_payment(self, payment_id, timeout=None):
+        """Retorna o pagamento pelo id"""
+        return await self._request('GET', f"/v1/payments/{payment_id}", timeout=timeout)
+
+    async def search_payments(self, params=None, timeout=None):
+        """Busca pagamentos (ex.: external_reference, status, sort, criteria, limit, offset)"""
+        return await self._request('GET', '/v1/payments/search', params=params, timeout=timeout)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Instância global do cliente
+_mercadopago_client = None
+
+def get_mercadopago_client():
+    global _mercadopago_client
+    if _mercadopago_client is None:
+        _mercadopago_client = MercadoPagoClient()
+    return _mercadopago_client
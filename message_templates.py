@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import string
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_FILE = 'messages.txt'
+
+# Intervalo mínimo entre verificações de mtime/tamanho do arquivo (segundos)
+CHECK_INTERVAL = 5.0
+
+_formatter = string.Formatter()
+
+
+class MessageTemplate:
+    """Mensagem com os placeholders ({dias}, {chave_pix}, ...) pré-compilados."""
+
+    def __init__(self, text):
+        self.text = text
+        self._parts = []
+        self.fields = set()
+        for literal, field, spec, conversion in _formatter.parse(text):
+            self._parts.append((literal, field, spec, conversion))
+            if field is not None:
+                self.fields.add(field)
+
+    @classmethod
+    def literal(cls, text):
+        """Template sem placeholders (texto exibido como está)"""
+        template = cls.__new__(cls)
+        template.text = text
+        template._parts = [(text, None, None, None)]
+        template.fields = set()
+        return template
+
+    def render(self, **values):
+        if not self.fields:
+            return self.text
+        out = []
+        for literal, field, spec, conversion in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            if field not in values:
+                # Placeholder sem valor é mantido como está
+                out.append('{' + field + ('!' + conversion if conversion else '') + (':' + spec if spec else '') + '}')
+                continue
+            value = values[field]
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            out.append(format(value, spec or ''))
+        return ''.join(out)
+
+
+def parse_messages(text):
+    """Converte o conteúdo do messages.txt (chave=valor por linha) em templates"""
+    templates = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        try:
+            templates[key] = MessageTemplate(value)
+        except ValueError as e:
+            # Chaves { } desbalanceadas: só esta mensagem fica sem placeholders
+            logger.error(f"Mensagem '{key}' com placeholders inválidos ({e}); usando o texto literal")
+            templates[key] = MessageTemplate.literal(value)
+    return templates
+
+
+class MessageCatalog:
+    """Conjunto imutável de templates carregados de uma versão do arquivo"""
+
+    def __init__(self, templates, version):
+        self._templates = templates
+        self.version = version
+
+    def __contains__(self, key):
+        return key in self._templates
+
+    def get(self, key, default=None):
+        template = self._templates.get(key)
+        return template.text if template is not None else default
+
+    def render(self, key, default='', **values):
+        template = self._templates.get(key)
+        if template is None:
+            template = MessageTemplate(default)
+        return template.render(**values)
+
+    def items(self):
+        return ((key, template.text) for key, template in self._templates.items())
+
+
+class MessageRegistry:
+    """Lê o messages.txt uma vez e só relê quando o arquivo muda."""
+
+    def __init__(self, path=MESSAGES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._signature = None
+        self._version = 0
+        self._last_check = 0.0
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _reload(self, signature):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            templates = parse_messages(f.read())
+        self._version += 1
+        self._catalog = MessageCatalog(templates, self._version)
+        self._signature = signature
+        logger.info(f"Mensagens carregadas: {len(templates)} templates (versão {self._version})")
+
+    def get(self):
+        """Retorna o catálogo atual ou None se o arquivo não puder ser carregado"""
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - self._last_check < CHECK_INTERVAL:
+            return catalog
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                signature = self._file_signature()
+                if self._catalog is None or signature != self._signature:
+                    self._reload(signature)
+            except Exception as e:
+                logger.error(f"Erro ao carregar mensagens: {e}")
+            return self._catalog
+
+    def invalidate(self):
+        """Força a releitura do arquivo na próxima chamada"""
+        with self._lock:
+            self._signature = None
+            self._last_check = 0.0
+
+
+# Instância global do registro de mensagens
+_message_registry = MessageRegistry(MESSAGES_FILE)
+
+def get_message_registry():
+    return _message_registry
+
+# Carregar mensagens (catálogo em cache)
+def load_messages():
+    return _message_registry.get()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ExtBot
+
+from rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Classes de prioridade (menor = mais urgente), passadas em rate_limit_args.
+# Começam em 1 porque o PTB descarta rate_limit_args "falsos".
+PRIORITY_FULFILLMENT = 1   # liberação de acesso: links de convite, confirmação de pagamento
+PRIORITY_USER = 2          # respostas a comandos e botões (padrão)
+PRIORITY_NOTICE = 3        # avisos de expiração e notificações ao admin
+PRIORITY_BROADCAST = 4     # broadcasts
+
+PRIORITY_NAMES = {
+    PRIORITY_FULFILLMENT: 'liberação',
+    PRIORITY_USER: 'respostas',
+    PRIORITY_NOTICE: 'avisos',
+    PRIORITY_BROADCAST: 'broadcast'
+}
+
+# Endpoints que contam como mensagem para o limite por chat
+_CHAT_PACED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+# Novas tentativas após RetryAfter antes de repassar o erro. É o único ponto
+# que repete chamadas por RetryAfter: quem chama não tenta de novo
+MAX_RETRIES = 3
+
+
+def priority_kwargs(bot, priority):
+    """rate_limit_args para a chamada; só o bot da aplicação (ExtBot) aceita"""
+    return {'rate_limit_args': priority} if isinstance(bot, ExtBot) else {}
+
+
+def retry_seconds(error):
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class OutboundDispatcher(BaseRateLimiter):
+    """Fila única de saída para todas as chamadas do bot à API do Telegram.
+
+    Ligado ao Application como rate limiter do PTB, então toda chamada do
+    ExtBot passa por aqui. Cada requisição espera o intervalo do seu chat e
+    depois disputa uma ficha do balde global; as fichas vão sempre para a
+    requisição de maior prioridade na fila. RetryAfter suspende o chat da
+    requisição (ou o balde, se não houver chat) e a requisição é repetida.
+    """
+
+    def __init__(self, limiter=None):
+        self._limiter = limiter or RateLimiter()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._pump = None
+        self._in_flight = 0
+        self._sent = {priority: 0 for priority in PRIORITY_NAMES}
+        self._max_wait = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._retry_after_count = 0
+        self._last_retry_after = None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._pump is not None:
+            self._pump.cancel()
+            self._pump = None
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    # Fila de prioridade
+
+    async def _admit(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.get_running_loop().create_task(self._run_pump())
+        await future
+
+    async def _run_pump(self):
+        # Entrega uma ficha do balde global por vez ao primeiro da fila
+        while self._waiters:
+            await self._limiter.bucket.acquire()
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = rate_limit_args if rate_limit_args in PRIORITY_NAMES else PRIORITY_USER
+        chat_id = data.get('chat_id')
+        paced = chat_id is not None and endpoint.startswith(_CHAT_PACED_PREFIXES)
+
+        for attempt in range(MAX_RETRIES + 1):
+            started = time.monotonic()
+            if paced:
+                await self._limiter.wait_chat(chat_id)
+            elif chat_id is not None:
+                await self._limiter.wait_pause(chat_id)
+            await self._admit(priority)
+            self._max_wait[priority] = max(self._max_wait[priority], time.monotonic() - started)
+
+            self._in_flight += 1
+            try:
+                result = await callback(*args, **kwargs)
+                self._sent[priority] += 1
+                return result
+            except RetryAfter as e:
+                seconds = retry_seconds(e)
+                self._retry_after_count += 1
+                self._last_retry_after = seconds
+                self._limiter.retry_after(seconds, chat_id)
+                logger.warning(
+                    f"RetryAfter de {seconds:.0f}s em {endpoint} "
+                    f"(prioridade {PRIORITY_NAMES[priority]}, tentativa {attempt + 1})"
+                )
+                if attempt == MAX_RETRIES:
+                    raise
+            finally:
+                self._in_flight -= 1
+
+    # Métricas
+
+    def metrics(self):
+        depth = {priority: 0 for priority in PRIORITY_NAMES}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[priority] += 1
+        return {
+            'queue_depth': {PRIORITY_NAMES[p]: count for p, count in depth.items()},
+            'in_flight': self._in_flight,
+            'sent': {PRIORITY_NAMES[p]: count for p, count in self._sent.items()},
+            'max_wait': {PRIORITY_NAMES[p]: round(wait, 2) for p, wait in self._max_wait.items()},
+            'retry_after_count': self._retry_after_count,
+            'last_retry_after': self._last_retry_after
+        }
+
+
+# Instância global da fila de saída
+_outbound_dispatcher = None
+
+def get_outbound_dispatcher():
+    global _outbound_dispatcher
+    if _outbound_dispatcher is None:
+        _outbound_dispatcher = OutboundDispatcher()
+    return _outbound_dispatcher
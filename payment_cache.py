@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from mercadopago_client import get_mercadopago_client
+
+logger = logging.getLogger(__name__)
+
+# Por quanto tempo um status não final é reaproveitado (segundos)
+DEFAULT_TTL = 3.0
+
+# Status que não mudam mais: ficam em cache enquanto o processo viver
+TERMINAL_STATUSES = ('approved', 'rejected', 'cancelled')
+
+# Limite de pagamentos guardados (os mais antigos saem primeiro)
+MAX_ENTRIES = 10000
+
+
+class PaymentStatusCache:
+    """Cache das consultas de pagamento ao Mercado Pago.
+
+    Consultas simultâneas do mesmo pagamento compartilham uma única
+    requisição; o resultado é reaproveitado por ttl segundos, ou para sempre
+    se o status for final.
+    """
+
+    def __init__(self, fetch, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def _cached(self, payment_id, now):
+        entry = self._entries.get(payment_id)
+        if entry is None:
+            return None
+        payment, fetched_at = entry
+        if payment.get('status') in TERMINAL_STATUSES or now - fetched_at < self.ttl:
+            self._entries.move_to_end(payment_id)
+            return payment
+        return None
+
+    def _store(self, payment_id, payment):
+        self._entries[payment_id] = (payment, time.monotonic())
+        self._entries.move_to_end(payment_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, payment_id):
+        """Retorna o pagamento, consultando a API só quando necessário"""
+        payment_id = str(payment_id)
+        payment = self._cached(payment_id, time.monotonic())
+        if payment is not None:
+            return payment
+
+        task = self._inflight.get(payment_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(payment_id))
+            self._inflight[payment_id] = task
+        # shield: um chamador cancelado não cancela a consulta dos demais
+        return await asyncio.shield(task)
+
+    async def _load(self, payment_id):
+        try:
+            payment = await self._fetch(payment_id)
+            if payment:
+                self._store(payment_id, payment)
+            return payment
+        finally:
+            self._inflight.pop(payment_id, None)
+
+    def invalidate(self, payment_id):
+        """Descarta o status guardado (ex.: notificação de mudança recebida)"""
+        entry = self._entries.get(str(payment_id))
+        if entry is not None and entry[0].get('status') not in TERMINAL_STATUSES:
+            del self._entries[str(payment_id)]
+
+
+# Instância global do cache
+_payment_cache = None
+
+def get_payment_cache():
+    global _payment_cache
+    if _payment_cache is None:
+        _payment_cache = PaymentStatusCache(get_mercadopago_client().get_payment)
+    return _payment_cache
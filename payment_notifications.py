@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Diferença máxima entre o ts da assinatura e o relógio local (segundos)
+SIGNATURE_TOLERANCE = 300
+
+# Notificações já vistas são ignoradas por este período (segundos)
+DEDUP_TTL = 600
+DEDUP_MAX_ENTRIES = 10000
+
+
+class NotificationError(Exception):
+    """Notificação do Mercado Pago inválida ou não assinada"""
+
+
+def parse_signature_header(header):
+    """Separa o cabeçalho x-signature ("ts=...,v1=...") em um dict"""
+    parts = {}
+    for item in (header or '').split(','):
+        key, _, value = item.strip().partition('=')
+        if key and value:
+            parts[key] = value
+    return parts
+
+
+def build_signature_manifest(data_id, request_id, ts):
+    """Monta o texto assinado pelo Mercado Pago (data.id em minúsculas quando alfanumérico)"""
+    manifest = ''
+    if data_id:
+        manifest += f"id:{str(data_id).lower()};"
+    if request_id:
+        manifest += f"request-id:{request_id};"
+    manifest += f"ts:{ts};"
+    return manifest
+
+
+def sign_notification(secret, data_id, request_id, ts):
+    """Gera o cabeçalho x-signature (usado pelo notificador de testes)"""
+    manifest = build_signature_manifest(data_id, request_id, ts)
+    digest = hmac.new(secret.encode(), manifest.encode(), hashlib.sha256).hexdigest()
+    return f"ts={ts},v1={digest}"
+
+
+def verify_signature(secret, signature_header, request_id, data_id, now=None):
+    """Confere o HMAC-SHA256 do cabeçalho x-signature. Levanta NotificationError se inválido"""
+    parts = parse_signature_header(signature_header)
+    ts = parts.get('ts')
+    received = parts.get('v1')
+    if not ts or not received:
+        raise NotificationError("Cabeçalho x-signature ausente ou incompleto")
+
+    try:
+        ts_seconds = int(ts) / 1000 if len(ts) > 10 else int(ts)
+    except ValueError:
+        raise NotificationError("Timestamp da assinatura inválido")
+    if abs((now or time.time()) - ts_seconds) > SIGNATURE_TOLERANCE:
+        raise NotificationError("Assinatura fora da janela de tempo permitida")
+
+    manifest = build_signature_manifest(data_id, request_id, ts)
+    expected = hmac.new(secret.encode(), manifest.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        raise NotificationError("Assinatura inválida")
+
+
+def extract_payment_id(args, body):
+    """Retorna o id do pagamento da notificação ou None se não for de pagamento"""
+    body = body or {}
+    topic = args.get('type') or args.get('topic') or body.get('type') or body.get('topic')
+    if topic not in ('payment', None):
+        return None
+    data_id = args.get('data.id') or (body.get('data') or {}).get('id') or args.get('id')
+    return str(data_id) if data_id else None
+
+
+class NotificationDeduplicator:
+    """Lembra as notificações recentes para descartar as reentregas do Mercado Pago"""
+
+    def __init__(self, ttl=DEDUP_TTL, max_entries=DEDUP_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_seen(self, key, now=None):
+        """True se a chave não foi vista dentro do TTL (e a registra)"""
+        now = now or time.time()
+        with self._lock:
+            while self._seen:
+                oldest_key, seen_at = next(iter(self._seen.items()))
+                if now - seen_at < self.ttl and len(self._seen) < self.max_entries:
+                    break
+                self._seen.popitem(last=False)
+            if key in self._seen:
+                return False
+            self._seen[key] = now
+            return True
+
+
+# Instância global do deduplicador
+_deduplicator = NotificationDeduplicator()
+
+def get_notification_deduplicator():
+    return _deduplicator
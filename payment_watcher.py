@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre consultas conforme a idade do pagamento: (idade até, intervalo) em segundos
+BACKOFF_SCHEDULE = ((120, 5), (600, 15), (1800, 30), (3600, 60))
+
+# Intervalo após a última faixa do BACKOFF_SCHEDULE
+MAX_INTERVAL = 300
+
+# Com as notificações do Mercado Pago ativas a consulta vira só uma rede de segurança
+PUSH_BACKOFF_SCHEDULE = ((600, 30), (3600, 120))
+
+# Idade máxima de um pagamento pendente (o PIX do Mercado Pago expira em 24h)
+PAYMENT_TTL = 24 * 3600
+
+# Pagamentos consultados por execução e consultas simultâneas à API
+BATCH_SIZE = 50
+MAX_CONCURRENT = 10
+
+# Transição final cujo callback falhou: nova tentativa após CALLBACK_RETRY_DELAY,
+# dobrando a cada falha (até MAX_INTERVAL), no máximo MAX_CALLBACK_FAILURES vezes
+CALLBACK_RETRY_DELAY = 30
+MAX_CALLBACK_FAILURES = 5
+
+# Status finais do Mercado Pago
+APPROVED_STATUSES = ('approved',)
+REJECTED_STATUSES = ('rejected', 'cancelled', 'refunded', 'charged_back')
+
+
+def poll_interval(age, schedule=None):
+    """Intervalo até a próxima consulta de um pagamento com a idade informada"""
+    for max_age, interval in (schedule or BACKOFF_SCHEDULE):
+        if age < max_age:
+            return interval
+    return MAX_INTERVAL
+
+
+class PaymentWatcher:
+    """Acompanha todos os PIX pendentes com um único job.
+
+    Cada pagamento fica no registro com o horário da próxima consulta; o job
+    run_once aponta para a consulta mais próxima, busca os pagamentos vencidos
+    em lote e repassa as transições (aprovado, rejeitado, expirado ou mudança
+    de status) para o callback. Um pagamento só sai do registro depois que o
+    callback da transição final conclui; se ele falhar, a transição é
+    repetida com intervalo crescente.
+    """
+
+    JOB_NAME = 'payment_watcher'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._schedule = None
+        self._job_queue = None
+        self._fetch = None
+        self._callback = None
+        self._job = None
+        self._deadline = None
+
+    def attach(self, job_queue, fetch, callback):
+        """Define o JobQueue, a corrotina que busca o pagamento e a que trata as transições.
+
+        O callback recebe (context, entry, status, payment), onde status é
+        'approved', 'rejected', 'expired' ou o novo status pendente.
+        """
+        self._job_queue = job_queue
+        self._fetch = fetch
+        self._callback = callback
+
+    def set_push_enabled(self, enabled):
+        """Com notificações ativas, usa o intervalo lento de segurança"""
+        self._schedule = PUSH_BACKOFF_SCHEDULE if enabled else None
+        if enabled:
+            logger.info("Notificações do Mercado Pago ativas: consulta de pagamentos em modo de segurança")
+
+    def _interval(self, age):
+        return poll_interval(age, self._schedule)
+
+    def watch(self, payment_id, **data):
+        """Passa a acompanhar o pagamento (data fica disponível no callback)"""
+        now = time.time()
+        entry = dict(data)
+        entry.update({
+            'payment_id': str(payment_id),
+            'created_at': now,
+            'next_check': now + self._interval(0),
+            'last_status': None
+        })
+        with self._lock:
+            self._pending[str(payment_id)] = entry
+        self.arm()
+        return entry
+
+    def discard(self, payment_id):
+        """Para de acompanhar o pagamento (ex.: verificado manualmente)"""
+        with self._lock:
+            return self._pending.pop(str(payment_id), None)
+
+    def poll_now(self, payment_id):
+        """Antecipa a consulta do pagamento (ex.: notificação recebida).
+
+        Retorna False se o pagamento não está sendo acompanhado.
+        """
+        with self._lock:
+            entry = self._pending.get(str(payment_id))
+            if entry is None:
+                return False
+            entry['next_check'] = time.time()
+        self.arm()
+        return True
+
+    def get(self, payment_id):
+        with self._lock:
+            return self._pending.get(str(payment_id))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _pop_due(self, now):
+        with self._lock:
+            due = sorted(
+                (entry for entry in self._pending.values() if entry['next_check'] <= now),
+                key=lambda entry: entry['next_check']
+            )
+            due = due[:BATCH_SIZE]
+            # Adia a próxima consulta já aqui, para que uma execução concorrente
+            # não consulte o mesmo pagamento enquanto este lote está em andamento
+            for entry in due:
+                entry['next_check'] = now + self._interval(now - entry['created_at'])
+            return due
+
+    def _next_check(self):
+        with self._lock:
+            if not self._pending:
+                return None
+            return min(entry['next_check'] for entry in self._pending.values())
+
+    async def _poll(self, entries):
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+
+        async def fetch(entry):
+            async with semaphore:
+                try:
+                    return await self._fetch(entry['payment_id'])
+                except Exception as e:
+                    logger.error(f"Erro ao consultar pagamento {entry['payment_id']}: {e}")
+                    return None
+
+        return await asyncio.gather(*(fetch(entry) for entry in entries))
+
+    async def _run(self, context):
+        with self._lock:
+            self._job = None
+            self._deadline = None
+
+        try:
+            now = time.time()
+            due = self._pop_due(now)
+            if due:
+                payments = await self._poll(due)
+                for entry, payment in zip(due, payments):
+                    await self._dispatch(context, entry, payment)
+        finally:
+            self.arm()
+
+    async def _dispatch(self, context, entry, payment):
+        payment_id = entry['payment_id']
+        if self.get(payment_id) is not entry:
+            # Descartado (ou substituído) enquanto a consulta estava em andamento
+            return
+
+        status = payment.get('status') if payment else None
+        now = time.time()
+        age = now - entry['created_at']
+
+        if status in APPROVED_STATUSES:
+            transition = 'approved'
+        elif payment and payment.get('status_detail') == 'expired':
+            # PIX vencido é cancelado pelo Mercado Pago com status_detail "expired"
+            transition = 'expired'
+        elif status in REJECTED_STATUSES:
+            transition = 'rejected'
+        elif age >= PAYMENT_TTL:
+            transition = 'expired'
+        else:
+            if status is None or status == entry['last_status']:
+                return
+            transition = status
+
+        final = transition in ('approved', 'rejected', 'expired')
+        try:
+            await self._callback(context, entry, transition, payment)
+        except Exception as e:
+            logger.error(f"Erro ao processar transição {transition} do pagamento {payment_id}: {e}")
+            if final:
+                failures = entry['failures'] = entry.get('failures', 0) + 1
+                if failures < MAX_CALLBACK_FAILURES:
+                    # Continua acompanhado: a transição é repetida na próxima consulta
+                    delay = min(MAX_INTERVAL, CALLBACK_RETRY_DELAY * 2 ** (failures - 1))
+                    with self._lock:
+                        entry['next_check'] = time.time() + delay
+                    logger.info(f"Pagamento {payment_id}: nova tentativa da transição {transition} em {delay}s")
+                    return
+                logger.error(f"Pagamento {payment_id}: transição {transition} abandonada após {failures} falhas")
+        entry['last_status'] = status
+
+        if final:
+            with self._lock:
+                if self._pending.get(payment_id) is entry:
+                    del self._pending[payment_id]
+
+    def arm(self):
+        """(Re)agenda o job para a próxima consulta pendente"""
+        if self._job_queue is None:
+            return
+
+        next_check = self._next_check()
+        if next_check is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            if self._job is not None and self._deadline is not None and self._deadline <= next_check:
+                return
+            if self._job is not None:
+                self._job.schedule_removal()
+            self._deadline = next_check
+            self._job = self._job_queue.run_once(self._run, when=max(0.0, next_check - now), name=self.JOB_NAME)
+
+
+# Instância global do monitor de pagamentos
+_payment_watcher = None
+
+def get_payment_watcher():
+    global _payment_watcher
+    if _payment_watcher is None:
+        _payment_watcher = PaymentWatcher()
+    return _payment_watcher
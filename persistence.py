@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from config_service import save_config
+
+logger = logging.getLogger(__name__)
+
+# Executor dedicado às escritas (uma thread, preserva a ordem dos commits)
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistence-write')
+
+# Executor das leituras pesadas (estatísticas, listas de usuários)
+_read_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='persistence-read')
+
+
+class AsyncRWLock:
+    """Lock de leitura/escrita para corrotinas (vários leitores ou um escritor).
+
+    Escritores têm preferência: novos leitores esperam enquanto houver um
+    escritor aguardando, para que um fluxo contínuo de leituras não atrase
+    os commits.
+    """
+
+    def __init__(self):
+        self._cond = None
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def _condition(self):
+        # Criado sob demanda para ficar ligado ao loop do bot
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @asynccontextmanager
+    async def reader(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with cond:
+                self._readers -= 1
+                if not self._readers:
+                    cond.notify_all()
+
+    @asynccontextmanager
+    async def writer(self):
+        cond = self._condition()
+        async with cond:
+            self._waiting_writers += 1
+            try:
+                await cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with cond:
+                self._writer = False
+                cond.notify_all()
+
+
+# Lock global de persistência (substitui o antigo json_lock)
+persistence_lock = AsyncRWLock()
+
+
+async def write(func, *args, **kwargs):
+    """Executa uma escrita no executor dedicado, sem bloquear o loop do bot"""
+    loop = asyncio.get_running_loop()
+    async with persistence_lock.writer():
+        return await loop.run_in_executor(_write_executor, functools.partial(func, *args, **kwargs))
+
+
+async def read(func, *args, **kwargs):
+    """Executa uma leitura fora do loop do bot"""
+    loop = asyncio.get_running_loop()
+    async with persistence_lock.reader():
+        return await loop.run_in_executor(_read_executor, functools.partial(func, *args, **kwargs))
+
+
+# Salvar configurações sem bloquear o loop
+async def save_config_async(config):
+    return await write(save_config, config)
+
+
+def shutdown():
+    """Aguarda as escritas pendentes e encerra os executores"""
+    _write_executor.shutdown(wait=True)
+    _read_executor.shutdown(wait=True)
+    logger.info("Executores de persistência encerrados")
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from config_service import load_config
+
+
+def normalize_plan_name(name):
+    """Normaliza o nome do plano para comparação (sem espaços extras, sem caixa)"""
+    return ' '.join(str(name).split()).casefold()
+
+
+class PlanCatalog:
+    """Índices dos planos VIP de um snapshot do config.
+
+    Montado uma vez por versão do config: planos por id e por nome
+    normalizado, rótulos dos botões e o mapa grupo -> planos.
+    """
+
+    def __init__(self, plans, version=None):
+        self.version = version
+        self.plans = tuple(plans)
+        self._by_id = {}
+        self._by_name = {}
+        self._labels = {}
+        self._prices = {}
+        self._group_plans = {}
+        for plan in self.plans:
+            self._by_id[plan['id']] = plan
+            self._by_name.setdefault(normalize_plan_name(plan['name']), plan)
+            self._prices[plan['id']] = f"R${plan['price']:.2f}"
+            self._labels[plan['id']] = f"💎 {plan['name']} - {self._prices[plan['id']]}"
+            for group_id in plan.get('groups', ()):
+                self._group_plans.setdefault(str(group_id), []).append(plan)
+        self._group_plans = {group_id: tuple(plans) for group_id, plans in self._group_plans.items()}
+
+    def get(self, plan_id):
+        """Retorna o plano pelo id (aceita int ou str) ou None"""
+        try:
+            return self._by_id.get(int(plan_id))
+        except (TypeError, ValueError):
+            return None
+
+    def find_by_name(self, name):
+        """Retorna o plano cujo nome corresponde (sem diferenciar maiúsculas) ou None"""
+        if not name:
+            return None
+        return self._by_name.get(normalize_plan_name(name))
+
+    def label(self, plan_id):
+        """Texto do botão de seleção do plano"""
+        plan = self.get(plan_id)
+        return self._labels[plan['id']] if plan else None
+
+    def price_label(self, plan_id):
+        plan = self.get(plan_id)
+        return self._prices[plan['id']] if plan else None
+
+    def plans_for_group(self, group_id):
+        """Planos que dão acesso ao grupo"""
+        return self._group_plans.get(str(group_id), ())
+
+    def group_ids(self):
+        return tuple(self._group_plans)
+
+    def names(self):
+        return [plan['name'] for plan in self.plans]
+
+    def __iter__(self):
+        return iter(self.plans)
+
+    def __len__(self):
+        return len(self.plans)
+
+    def __contains__(self, plan_id):
+        return self.get(plan_id) is not None
+
+
+# Catálogo do último snapshot carregado
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_plan_catalog(config=None):
+    """Retorna o catálogo de planos do config atual (reconstruído só quando a versão muda)"""
+    global _catalog
+    if config is None:
+        config = load_config()
+        if config is None:
+            return PlanCatalog(())
+
+    version = getattr(config, 'version', None)
+    if version is None:
+        # Cópia mutável em edição: não entra no cache
+        return PlanCatalog(config.get('vip_plans', ()))
+
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = PlanCatalog(config.get('vip_plans', ()), version)
+        return _catalog
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+# Limites do Telegram: ~30 mensagens/s no total, 1 mensagem/s por chat
+# privado e 20 mensagens/min por grupo
+GLOBAL_RATE = 25
+GLOBAL_BURST = 25
+PER_CHAT_INTERVAL = 1.0
+PER_GROUP_INTERVAL = 3.0
+
+# Chats lembrados pelo limite por chat (os mais antigos são descartados)
+MAX_TRACKED_CHATS = 10000
+
+
+class TokenBucket:
+    """Balde de fichas: rate fichas por segundo, até capacity acumuladas"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = None
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Consome as fichas se houver; retorna quanto esperar (0 se conseguiu)"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens=1):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # O lock mantém a ordem de chegada entre os que esperam
+        async with self._lock:
+            while True:
+                wait = self.try_acquire(tokens)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def block(self, seconds):
+        """Suspende o balde (ex.: RetryAfter do Telegram) e zera as fichas"""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = self._blocked_until
+
+
+class RateLimiter:
+    """Limite global do bot somado ao intervalo mínimo entre mensagens do mesmo chat"""
+
+    def __init__(self, global_rate=GLOBAL_RATE, burst=GLOBAL_BURST,
+                 per_chat_interval=PER_CHAT_INTERVAL, per_group_interval=PER_GROUP_INTERVAL):
+        self.bucket = TokenBucket(global_rate, burst)
+        self.per_chat_interval = per_chat_interval
+        self.per_group_interval = per_group_interval
+        self._chat_next = {}
+        self._chat_paused = {}
+
+    def _chat_interval(self, chat_id):
+        # IDs negativos são grupos/canais
+        try:
+            return self.per_group_interval if int(chat_id) < 0 else self.per_chat_interval
+        except (TypeError, ValueError):
+            return self.per_group_interval
+
+    async def wait_chat(self, chat_id):
+        """Espera o intervalo mínimo desde a última mensagem para o chat"""
+        # Reserva o próximo horário livre do chat antes de esperar
+        key = str(chat_id)
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(key, 0.0), self._chat_paused.get(key, 0.0))
+        self._chat_next[key] = slot + self._chat_interval(chat_id)
+        if len(self._chat_next) > MAX_TRACKED_CHATS:
+            self._forget_idle(now)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def wait_pause(self, chat_id):
+        """Espera só o fim de um RetryAfter do chat (chamadas fora do limite por chat)"""
+        pause = self._chat_paused.get(str(chat_id), 0.0) - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    async def acquire(self, chat_id):
+        await self.wait_chat(chat_id)
+        await self.bucket.acquire()
+
+    def retry_after(self, seconds, chat_id=None):
+        """Aplica o RetryAfter recebido do Telegram.
+
+        Um RetryAfter de um chat pausa só esse chat; sem chat, pausa o balde global.
+        """
+        if chat_id is None:
+            self.bucket.block(seconds)
+            return
+        key = str(chat_id)
+        self._chat_paused[key] = max(self._chat_paused.get(key, 0.0), time.monotonic() + seconds)
+
+    def _forget_idle(self, now):
+        for chat_id, next_slot in list(self._chat_next.items()):
+            if next_slot <= now:
+                del self._chat_next[chat_id]
+        for chat_id, paused_until in list(self._chat_paused.items()):
+            if paused_until <= now:
+                del self._chat_paused[chat_id]
+
+
+# Limitador global dos envios do bot
+_rate_limiter = None
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import heapq
+import logging
+import threading
+import time
+
+from subscription_index import get_subscription_index
+
+logger = logging.getLogger(__name__)
+
+# Avisos antes da expiração: (horas antes, flag persistida na assinatura)
+REMINDER_WINDOWS = ((72, 'notified_3'), (48, 'notified_2'), (24, 'notified_1'))
+
+# Largura de cada slot da roda (segundos)
+SLOT_SECONDS = 60
+
+# Atraso máximo de um agendamento (re-arma mesmo sem avisos pendentes)
+MAX_DELAY = 6 * 3600
+
+
+class ReminderWheel:
+    """Roda de timers com os avisos de 72h/48h/24h de cada assinatura.
+
+    Os horários exatos são calculados quando a assinatura é registrada ou
+    renovada; cada slot de SLOT_SECONDS guarda os avisos que vencem nele e um
+    único job run_once aponta para o próximo aviso.
+    """
+
+    JOB_NAME = 'reminder_wheel'
+
+    def __init__(self, subscription_index):
+        self._index = subscription_index
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._slot_heap = []
+        self._entries = {}
+        self._job_queue = None
+        self._callback = None
+        self._job = None
+        self._deadline = None
+
+    def attach(self, job_queue, callback):
+        """Define o JobQueue e a função chamada com os avisos vencidos"""
+        self._job_queue = job_queue
+        self._callback = callback
+
+    # Manutenção da roda
+
+    def _add(self, sub_id, flag, fire_at):
+        slot = int(fire_at // SLOT_SECONDS)
+        bucket = self._slots.get(slot)
+        if bucket is None:
+            bucket = self._slots[slot] = {}
+            heapq.heappush(self._slot_heap, slot)
+        bucket[(sub_id, flag)] = fire_at
+        self._entries.setdefault(sub_id, []).append((slot, flag))
+
+    def _cancel(self, sub_id):
+        for slot, flag in self._entries.pop(sub_id, ()):
+            bucket = self._slots.get(slot)
+            if bucket is not None:
+                bucket.pop((sub_id, flag), None)
+                if not bucket:
+                    del self._slots[slot]
+
+    def schedule(self, sub, now=None):
+        """Calcula os horários de aviso da assinatura e os coloca na roda"""
+        now = now or time.time()
+        with self._lock:
+            self._cancel(sub['id'])
+            if sub.get('is_permanent', False):
+                return
+            end_ts = self._index.get_end_timestamp(sub['id'])
+            if end_ts is None or end_ts <= now:
+                return
+
+            overdue_flag = None
+            for hours, flag in REMINDER_WINDOWS:
+                fire_at = end_ts - hours * 3600
+                if fire_at <= now:
+                    # Janela já iniciada: só o aviso mais próximo é enviado
+                    overdue_flag = None if sub.get(flag, False) else flag
+                elif not sub.get(flag, False):
+                    self._add(sub['id'], flag, fire_at)
+            if overdue_flag is not None:
+                self._add(sub['id'], overdue_flag, now)
+
+    def schedule_many(self, subscriptions):
+        now = time.time()
+        for sub in subscriptions:
+            self.schedule(sub, now)
+
+    def cancel(self, sub_id):
+        with self._lock:
+            self._cancel(sub_id)
+
+    def pop_due(self, now=None):
+        """Remove e retorna os avisos vencidos como (sub_id, flag)"""
+        now = now or time.time()
+        now_slot = int(now // SLOT_SECONDS)
+        due = []
+        with self._lock:
+            while self._slot_heap and self._slot_heap[0] <= now_slot:
+                slot = self._slot_heap[0]
+                bucket = self._slots.get(slot)
+                if bucket is None:
+                    heapq.heappop(self._slot_heap)
+                    continue
+                for key, fire_at in list(bucket.items()):
+                    if fire_at <= now:
+                        due.append(key)
+                        del bucket[key]
+                        entries = self._entries.get(key[0])
+                        if entries is not None:
+                            entries.remove((slot, key[1]))
+                            if not entries:
+                                del self._entries[key[0]]
+                if bucket:
+                    # Restam avisos no slot atual ainda não vencidos
+                    break
+                del self._slots[slot]
+                heapq.heappop(self._slot_heap)
+        return due
+
+    def next_fire(self):
+        with self._lock:
+            while self._slot_heap and self._slot_heap[0] not in self._slots:
+                heapq.heappop(self._slot_heap)
+            if not self._slot_heap:
+                return None
+            return min(self._slots[self._slot_heap[0]].values())
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(bucket) for bucket in self._slots.values())
+
+    # Agendamento no JobQueue
+
+    async def _run(self, context):
+        with self._lock:
+            self._job = None
+            self._deadline = None
+        await self._callback(context, self.pop_due())
+
+    def arm(self):
+        """(Re)agenda o job para o próximo aviso, se ele mudou"""
+        if self._job_queue is None:
+            return
+
+        next_fire = self.next_fire()
+        now = time.time()
+        deadline = now + MAX_DELAY if next_fire is None else min(next_fire, now + MAX_DELAY)
+
+        with self._lock:
+            if self._job is not None and self._deadline is not None and self._deadline <= deadline:
+                return
+            if self._job is not None:
+                self._job.schedule_removal()
+            self._deadline = deadline
+            self._job = self._job_queue.run_once(self._run, when=max(0.0, deadline - now), name=self.JOB_NAME)
+
+
+# Instância global da roda de avisos
+_reminder_wheel = None
+
+def get_reminder_wheel():
+    global _reminder_wheel
+    if _reminder_wheel is None:
+        _reminder_wheel = ReminderWheel(get_subscription_index())
+    return _reminder_wheel
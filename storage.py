@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Arquivo do banco de dados e arquivos JSON legados
+DB_FILE = 'bot.db'
+LEGACY_SUBSCRIPTIONS_FILE = 'subscriptions.json'
+LEGACY_STATS_FILE = 'stats.json'
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Colunas booleanas das assinaturas (convertidas de/para 0/1)
+SUBSCRIPTION_FLAGS = ('is_permanent', 'notified_1', 'notified_2', 'notified_3', 'renewal_notified')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    plan_id INTEGER NOT NULL,
+    end_date TEXT NOT NULL,
+    payment_method TEXT,
+    payment_status TEXT,
+    payment_id TEXT,
+    is_permanent INTEGER NOT NULL DEFAULT 0,
+    notified_1 INTEGER NOT NULL DEFAULT 0,
+    notified_2 INTEGER NOT NULL DEFAULT 0,
+    notified_3 INTEGER NOT NULL DEFAULT 0,
+    renewal_notified INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions (user_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_end_date ON subscriptions (end_date);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_payment_id ON subscriptions (payment_id);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    joined_date TEXT NOT NULL,
+    is_vip INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS fulfillments (
+    payment_id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    plan_id INTEGER,
+    status TEXT NOT NULL,
+    claimed_at TEXT NOT NULL,
+    finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    audience TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL,
+    admin_chat_id INTEGER,
+    progress_message_id INTEGER,
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    last_user_id INTEGER,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS invite_links (
+    invite_link TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    expire_date TEXT NOT NULL,
+    user_id INTEGER,
+    issued_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_invite_links_group_status ON invite_links (group_id, status);
+
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    is_bot INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_SUBSCRIPTION_COLUMNS = (
+    'user_id', 'plan_id', 'end_date', 'payment_method', 'payment_status', 'payment_id'
+) + SUBSCRIPTION_FLAGS
+
+
+def _row_to_subscription(row):
+    """Converte uma linha do banco no mesmo formato usado no subscriptions.json"""
+    if row is None:
+        return None
+    sub = dict(row)
+    for flag in SUBSCRIPTION_FLAGS:
+        sub[flag] = bool(sub[flag])
+    return sub
+
+
+def _row_to_user(row):
+    if row is None:
+        return None
+    user = dict(row)
+    user['is_vip'] = bool(user['is_vip'])
+    return user
+
+
+class Storage:
+    """Repositório de assinaturas e usuários em SQLite (modo WAL)."""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Metadados
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    # Assinaturas
+
+    def _insert_subscription(self, sub):
+        values = []
+        for column in _SUBSCRIPTION_COLUMNS:
+            value = sub.get(column)
+            if column in SUBSCRIPTION_FLAGS:
+                value = int(bool(value))
+            elif column == 'payment_id' and value is not None:
+                value = str(value)
+            values.append(value)
+        cursor = self._conn.execute(
+            f"INSERT INTO subscriptions ({', '.join(_SUBSCRIPTION_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in _SUBSCRIPTION_COLUMNS)})",
+            values
+        )
+        return cursor.lastrowid
+
+    def add_subscription(self, sub):
+        """Insere uma assinatura e retorna o registro salvo (com id)"""
+        with self._lock, self._conn:
+            sub_id = self._insert_subscription(sub)
+            row = self._conn.execute("SELECT * FROM subscriptions WHERE id = ?", (sub_id,)).fetchone()
+        return _row_to_subscription(row)
+
+    def replace_subscription(self, old_id, sub):
+        """Substitui uma assinatura (renovação) em uma única transação"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM subscriptions WHERE id = ?", (old_id,))
+            sub_id = self._insert_subscription(sub)
+            row = self._conn.execute("SELECT * FROM subscriptions WHERE id = ?", (sub_id,)).fetchone()
+        return _row_to_subscription(row)
+
+    def delete_subscriptions(self, sub_ids):
+        sub_ids = list(sub_ids)
+        if not sub_ids:
+            return 0
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "DELETE FROM subscriptions WHERE id = ?",
+                [(sub_id,) for sub_id in sub_ids]
+            )
+        return cursor.rowcount
+
+    def set_subscription_flag(self, sub_id, flag, value=True):
+        if flag not in SUBSCRIPTION_FLAGS:
+            raise ValueError(f"Flag de assinatura inválida: {flag}")
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE subscriptions SET {flag} = ? WHERE id = ?",
+                (int(bool(value)), sub_id)
+            )
+
+    def list_subscriptions(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM subscriptions ORDER BY end_date").fetchall()
+        return [_row_to_subscription(row) for row in rows]
+
+    # Registro de liberações (um pagamento gera acesso uma única vez)
+
+    def claim_fulfillment(self, payment_id, user_id=None, plan_id=None):
+        """Reserva o pagamento para liberação. Retorna False se já foi reservado ou liberado"""
+        now = datetime.now().strftime(DATE_FORMAT)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO fulfillments (payment_id, user_id, plan_id, status, claimed_at) "
+                "VALUES (?, ?, ?, 'claimed', ?)",
+                (str(payment_id), user_id, plan_id, now)
+            )
+            if cursor.rowcount == 0:
+                # Só uma liberação que falhou pode ser tentada de novo
+                cursor = self._conn.execute(
+                    "UPDATE fulfillments SET status = 'claimed', user_id = ?, plan_id = ?, "
+                    "claimed_at = ?, finished_at = NULL WHERE payment_id = ? AND status = 'failed'",
+                    (user_id, plan_id, now, str(payment_id))
+                )
+        return cursor.rowcount == 1
+
+    def finish_fulfillment(self, payment_id, success=True):
+        """Marca a reserva como liberada (fulfilled) ou falha (failed)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE fulfillments SET status = ?, finished_at = ? WHERE payment_id = ?",
+                ('fulfilled' if success else 'failed', datetime.now().strftime(DATE_FORMAT), str(payment_id))
+            )
+
+    def list_fulfillment_states(self):
+        """Retorna {payment_id: status} de todo o registro"""
+        with self._lock:
+            rows = self._conn.execute("SELECT payment_id, status FROM fulfillments").fetchall()
+        return {row['payment_id']: row['status'] for row in rows}
+
+    def backfill_fulfillments(self):
+        """Registra como liberados os pagamentos das assinaturas já existentes"""
+        now = datetime.now().strftime(DATE_FORMAT)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO fulfillments (payment_id, user_id, plan_id, status, claimed_at, finished_at) "
+                "SELECT payment_id, user_id, plan_id, 'fulfilled', ?, ? FROM subscriptions "
+                "WHERE payment_id IS NOT NULL AND payment_id != ''",
+                (now, now)
+            )
+        return cursor.rowcount
+
+    # Usuários
+
+    def apply_user_batch(self, new_users, vip_flags):
+        """Grava um lote de usuários novos e mudanças de status VIP em uma única transação"""
+        with self._lock, self._conn:
+            inserted = 0
+            if new_users:
+                cursor = self._conn.executemany(
+                    "INSERT OR IGNORE INTO users (id, username, first_name, last_name, joined_date, is_vip) "
+                    "VALUES (:id, :username, :first_name, :last_name, :joined_date, :is_vip)",
+                    [dict(user, is_vip=int(bool(user.get('is_vip', False)))) for user in new_users]
+                )
+                inserted = cursor.rowcount
+                if inserted:
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('stats_last_update', ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                        (max(user['joined_date'] for user in new_users),)
+                    )
+            if vip_flags:
+                self._conn.executemany(
+                    "UPDATE users SET is_vip = ? WHERE id = ?",
+                    [(int(bool(is_vip)), user_id) for user_id, is_vip in vip_flags.items()]
+                )
+        return inserted
+
+    def set_synchronous(self, mode):
+        """Ajusta o PRAGMA synchronous (NORMAL ou FULL)"""
+        if mode not in ('NORMAL', 'FULL'):
+            raise ValueError(f"Modo synchronous inválido: {mode}")
+        with self._lock:
+            self._conn.execute(f"PRAGMA synchronous={mode}")
+
+    def list_user_ids(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM users ORDER BY id").fetchall()
+        return [row['id'] for row in rows]
+
+    def list_user_ids_after(self, user_id=None, limit=500):
+        """Próxima página de IDs de usuários (ordenados), após user_id"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                (user_id if user_id is not None else -2**63, limit)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+    def get_stats_summary(self, last_users=5):
+        with self._lock:
+            total_users = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            total_vips = self._conn.execute("SELECT COUNT(*) FROM users WHERE is_vip = 1").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT * FROM users ORDER BY joined_date DESC, rowid DESC LIMIT ?",
+                (last_users,)
+            ).fetchall()
+        return {
+            "total_users": total_users,
+            "total_vips": total_vips,
+            "last_update": self.get_meta('stats_last_update', '-'),
+            "last_users": [_row_to_user(row) for row in reversed(rows)]
+        }
+
+    # Broadcasts
+
+    def create_broadcast(self, audience, text, total, admin_chat_id=None):
+        now = datetime.now().strftime(DATE_FORMAT)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO broadcasts (audience, text, status, admin_chat_id, total, created_at, updated_at) "
+                "VALUES (?, ?, 'running', ?, ?, ?, ?)",
+                (audience, text, admin_chat_id, total, now, now)
+            )
+            row = self._conn.execute("SELECT * FROM broadcasts WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return dict(row)
+
+    def update_broadcast(self, broadcast_id, **fields):
+        columns = ('status', 'progress_message_id', 'total', 'sent', 'failed', 'last_user_id')
+        invalid = set(fields) - set(columns)
+        if invalid:
+            raise ValueError(f"Campos de broadcast inválidos: {', '.join(sorted(invalid))}")
+        fields['updated_at'] = datetime.now().strftime(DATE_FORMAT)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE broadcasts SET {', '.join(f'{column} = ?' for column in fields)} WHERE id = ?",
+                (*fields.values(), broadcast_id)
+            )
+
+    def get_broadcast(self, broadcast_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_broadcasts(self, statuses):
+        statuses = tuple(statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM broadcasts WHERE status IN ({', '.join('?' for _ in statuses)}) ORDER BY id",
+                statuses
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # Links de convite pré-gerados
+
+    def add_invite_link(self, invite_link, group_id, expire_date):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO invite_links (invite_link, group_id, status, created_at, expire_date) "
+                "VALUES (?, ?, 'ready', ?, ?)",
+                (invite_link, str(group_id), datetime.now().strftime(DATE_FORMAT), expire_date)
+            )
+
+    def list_ready_invite_links(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT invite_link, group_id, expire_date FROM invite_links "
+                "WHERE status = 'ready' ORDER BY expire_date"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def issue_invite_link(self, invite_link, user_id):
+        """Marca o link como entregue. Retorna False se ele não estava disponível"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE invite_links SET status = 'issued', user_id = ?, issued_at = ? "
+                "WHERE invite_link = ? AND status = 'ready'",
+                (user_id, datetime.now().strftime(DATE_FORMAT), invite_link)
+            )
+        return cursor.rowcount == 1
+
+    def revoke_invite_links(self, invite_links):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE invite_links SET status = 'revoked' WHERE invite_link = ? AND status = 'ready'",
+                [(invite_link,) for invite_link in invite_links]
+            )
+
+    # Membros dos grupos VIP (mantidos pelos updates chat_member)
+
+    def set_group_member(self, group_id, user_id, status, is_bot=False):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO group_members (group_id, user_id, status, is_bot, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(group_id, user_id) DO UPDATE SET status = excluded.status, "
+                "is_bot = excluded.is_bot, updated_at = excluded.updated_at",
+                (str(group_id), user_id, status, int(is_bot), datetime.now().strftime(DATE_FORMAT))
+            )
+
+    def list_group_members(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT group_id, user_id, status, is_bot FROM group_members").fetchall()
+        return [dict(row, is_bot=bool(row['is_bot'])) for row in rows]
+
+    # Importação dos arquivos JSON legados
+
+    def import_legacy_json(self, subscriptions_file=LEGACY_SUBSCRIPTIONS_FILE, stats_file=LEGACY_STATS_FILE):
+        """Importa subscriptions.json e stats.json uma única vez"""
+        if self.get_meta('legacy_json_imported'):
+            return False
+
+        subscriptions = []
+        if os.path.exists(subscriptions_file):
+            with open(subscriptions_file, 'r', encoding='utf-8') as f:
+                subscriptions = json.load(f)
+
+        stats = {}
+        if os.path.exists(stats_file):
+            with open(stats_file, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+
+        with self._lock, self._conn:
+            for sub in subscriptions:
+                self._insert_subscription(sub)
+            for user in stats.get('users', []):
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO users (id, username, first_name, last_name, joined_date, is_vip) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        user['id'],
+                        user.get('username'),
+                        user.get('first_name'),
+                        user.get('last_name'),
+                        user.get('joined_date') or datetime.now().strftime(DATE_FORMAT),
+                        int(bool(user.get('is_vip', False)))
+                    )
+                )
+            if stats.get('last_update'):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('stats_last_update', ?)",
+                    (stats['last_update'],)
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                (datetime.now().strftime(DATE_FORMAT),)
+            )
+
+        logger.info(
+            f"Importação dos arquivos JSON concluída: {len(subscriptions)} assinaturas, "
+            f"{len(stats.get('users', []))} usuários"
+        )
+        return True
+
+
+# Instância global do repositório
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Retorna o repositório global, criando e importando os JSON legados na primeira chamada"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = Storage(DB_FILE)
+            try:
+                _storage.import_legacy_json()
+            except Exception as e:
+                logger.error(f"Erro ao importar arquivos JSON legados: {e}")
+        return _storage
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+import threading
+from datetime import datetime
+
+from persistence import write
+from storage import DATE_FORMAT, get_storage
+
+logger = logging.getLogger(__name__)
+
+
+def parse_end_date(sub):
+    """Converte o end_date da assinatura em timestamp (epoch)"""
+    return datetime.strptime(sub['end_date'], DATE_FORMAT).timestamp()
+
+
+class SubscriptionIndex:
+    """Índice em memória das assinaturas com escrita direta (write-through) no banco.
+
+    Mantém user_id -> assinatura ativa, payment_id -> assinatura e uma lista
+    ordenada de (expiração, id) para as assinaturas não permanentes.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._end_ts = {}
+        self._by_user = {}
+        self._user_subs = {}
+        self._by_payment = {}
+        self._expiry = []
+
+    def load(self):
+        """Carrega todas as assinaturas do banco (uma vez, na inicialização)"""
+        subscriptions = self._storage.list_subscriptions()
+        with self._lock:
+            self._by_id.clear()
+            self._end_ts.clear()
+            self._by_user.clear()
+            self._user_subs.clear()
+            self._by_payment.clear()
+            self._expiry = []
+            for sub in subscriptions:
+                self._index(sub)
+        logger.info(f"Índice de assinaturas carregado: {len(subscriptions)} assinaturas")
+
+    # Manutenção das estruturas em memória
+
+    def _index(self, sub):
+        sub_id = sub['id']
+        end_ts = parse_end_date(sub)
+        self._by_id[sub_id] = sub
+        self._end_ts[sub_id] = end_ts
+        self._user_subs.setdefault(sub['user_id'], set()).add(sub_id)
+        if sub.get('payment_id') is not None:
+            self._by_payment[str(sub['payment_id'])] = sub
+        if not sub.get('is_permanent', False):
+            bisect.insort(self._expiry, (end_ts, sub_id))
+
+        current = self._by_user.get(sub['user_id'])
+        if current is None or end_ts > self._end_ts[current['id']]:
+            self._by_user[sub['user_id']] = sub
+
+    def _unindex(self, sub_id):
+        sub = self._by_id.pop(sub_id, None)
+        if sub is None:
+            return
+        end_ts = self._end_ts.pop(sub_id)
+        if sub.get('payment_id') is not None:
+            payment_id = str(sub['payment_id'])
+            if self._by_payment.get(payment_id) is sub:
+                del self._by_payment[payment_id]
+        if not sub.get('is_permanent', False):
+            pos = bisect.bisect_left(self._expiry, (end_ts, sub_id))
+            if pos < len(self._expiry) and self._expiry[pos] == (end_ts, sub_id):
+                del self._expiry[pos]
+
+        user_id = sub['user_id']
+        remaining = self._user_subs.get(user_id, set())
+        remaining.discard(sub_id)
+        if not remaining:
+            self._user_subs.pop(user_id, None)
+            self._by_user.pop(user_id, None)
+        elif self._by_user.get(user_id) is sub:
+            best_id = max(remaining, key=self._end_ts.__getitem__)
+            self._by_user[user_id] = self._by_id[best_id]
+
+    # Consultas (O(1) / O(log n))
+
+    def get_active(self, user_id, now=None):
+        """Retorna a assinatura ativa do usuário ou None"""
+        now_ts = (now or datetime.now()).timestamp()
+        with self._lock:
+            sub = self._by_user.get(user_id)
+            if sub is not None and self._end_ts[sub['id']] > now_ts:
+                return sub
+        return None
+
+    def active_plan_ids(self, user_id, now=None):
+        """Planos de todas as assinaturas ativas do usuário"""
+        now_ts = (now or datetime.now()).timestamp()
+        with self._lock:
+            return {
+                self._by_id[sub_id]['plan_id'] for sub_id in self._user_subs.get(user_id, ())
+                if self._end_ts[sub_id] > now_ts
+            }
+
+    def get(self, sub_id):
+        with self._lock:
+            return self._by_id.get(sub_id)
+
+    def get_by_payment(self, payment_id):
+        with self._lock:
+            return self._by_payment.get(str(payment_id))
+
+    def get_end_timestamp(self, sub_id):
+        with self._lock:
+            return self._end_ts.get(sub_id)
+
+    def active_subscriptions(self, now=None):
+        now_ts = (now or datetime.now()).timestamp()
+        with self._lock:
+            return [sub for sub_id, sub in self._by_id.items() if self._end_ts[sub_id] > now_ts]
+
+    def active_user_ids(self, now=None):
+        now_ts = (now or datetime.now()).timestamp()
+        with self._lock:
+            return {
+                user_id for user_id, sub in self._by_user.items()
+                if self._end_ts[sub['id']] > now_ts
+            }
+
+    def expired(self, now=None):
+        """Assinaturas não permanentes já expiradas, da mais antiga para a mais nova"""
+        now_ts = (now or datetime.now()).timestamp()
+        with self._lock:
+            pos = bisect.bisect_right(self._expiry, (now_ts, float('inf')))
+            return [self._by_id[sub_id] for _, sub_id in self._expiry[:pos]]
+
+    def expiring(self, now=None):
+        """Assinaturas não permanentes ainda ativas, ordenadas pela expiração"""
+        now_ts = (now or datetime.now()).timestamp()
+        with self._lock:
+            pos = bisect.bisect_right(self._expiry, (now_ts, float('inf')))
+            return [self._by_id[sub_id] for _, sub_id in self._expiry[pos:]]
+
+    def next_expiry(self):
+        """Timestamp da próxima expiração ou None"""
+        with self._lock:
+            return self._expiry[0][0] if self._expiry else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    # Mutações (escrita direta no banco, fora do loop de eventos)
+
+    async def add(self, sub):
+        saved = await write(self._storage.add_subscription, sub)
+        with self._lock:
+            self._index(saved)
+        return saved
+
+    async def replace(self, old_id, sub):
+        saved = await write(self._storage.replace_subscription, old_id, sub)
+        with self._lock:
+            self._unindex(old_id)
+            self._index(saved)
+        return saved
+
+    async def remove_many(self, sub_ids):
+        sub_ids = list(sub_ids)
+        removed = await write(self._storage.delete_subscriptions, sub_ids)
+        with self._lock:
+            for sub_id in sub_ids:
+                self._unindex(sub_id)
+        return removed
+
+    async def set_flag(self, sub_id, flag, value=True):
+        await write(self._storage.set_subscription_flag, sub_id, flag, value)
+        with self._lock:
+            sub = self._by_id.get(sub_id)
+            if sub is not None:
+                sub[flag] = bool(value)
+
+
+# Instância global do índice
+_subscription_index = None
+_index_lock = threading.Lock()
+
+def get_subscription_index():
+    """Retorna o índice global, carregando-o do banco na primeira chamada"""
+    global _subscription_index
+    with _index_lock:
+        if _subscription_index is None:
+            _subscription_index = SubscriptionIndex(get_storage())
+            _subscription_index.load()
+        return _subscription_index
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from datetime import datetime
+
+import persistence
+from storage import DATE_FORMAT, get_storage
+
+logger = logging.getLogger(__name__)
+
+# Modos de durabilidade:
+#   strict  - cada alteração é gravada (e sincronizada no disco) antes de retornar
+#   batched - alterações acumuladas e gravadas em lote (group commit)
+DURABILITY_MODES = ('strict', 'batched')
+
+DEFAULT_FLUSH_INTERVAL_MS = 500
+DEFAULT_MAX_BATCH = 200
+
+
+class UserStatsWriter:
+    """Buffer write-behind para novos usuários e mudanças de status VIP.
+
+    As alterações são agrupadas e gravadas em uma única transação a cada
+    flush_interval_ms ou quando o lote atinge max_batch registros.
+    """
+
+    def __init__(self, storage, durability='batched',
+                 flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS, max_batch=DEFAULT_MAX_BATCH):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Modo de durabilidade inválido: {durability}")
+        self._storage = storage
+        self.durability = durability
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self._new_users = {}
+        self._vip_flags = {}
+        self._known_users = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._task = None
+
+    @classmethod
+    def from_config(cls, storage, config):
+        settings = (config or {}).get('storage', {})
+        return cls(
+            storage,
+            durability=settings.get('durability', 'batched'),
+            flush_interval_ms=settings.get('flush_interval_ms', DEFAULT_FLUSH_INTERVAL_MS),
+            max_batch=settings.get('max_batch', DEFAULT_MAX_BATCH)
+        )
+
+    def _pending(self):
+        return len(self._new_users) + len(self._vip_flags)
+
+    def load_known_users(self):
+        """Carrega em memória os IDs de todos os usuários já cadastrados"""
+        self._known_users = set(self._storage.list_user_ids())
+        self._known_users.update(self._new_users)
+        logger.info(f"{len(self._known_users)} usuários conhecidos carregados")
+
+    def is_known_user(self, user_id):
+        """Verifica em O(1) se o usuário já está cadastrado ou na fila de gravação"""
+        if self._known_users is None:
+            self.load_known_users()
+        return user_id in self._known_users
+
+    async def add_user(self, user_id, username=None, first_name=None, last_name=None):
+        """Enfileira um novo usuário"""
+        if self._known_users is None:
+            self.load_known_users()
+        self._known_users.add(user_id)
+        if user_id not in self._new_users:
+            self._new_users[user_id] = {
+                "id": user_id,
+                "username": username,
+                "first_name": first_name,
+                "last_name": last_name,
+                "joined_date": datetime.now().strftime(DATE_FORMAT),
+                "is_vip": False
+            }
+        await self._after_change()
+
+    async def set_vip(self, user_id, is_vip=True):
+        """Enfileira uma mudança de status VIP (a última alteração prevalece)"""
+        self._vip_flags[user_id] = bool(is_vip)
+        await self._after_change()
+
+    async def set_vip_many(self, user_ids, is_vip=True):
+        for user_id in user_ids:
+            self._vip_flags[user_id] = bool(is_vip)
+        await self._after_change()
+
+    async def _after_change(self):
+        if self.durability == 'strict' or self._task is None:
+            await self.flush()
+        elif self._pending() >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Grava o lote pendente em uma única transação"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending():
+                return 0
+            new_users = list(self._new_users.values())
+            vip_flags = dict(self._vip_flags)
+            self._new_users.clear()
+            self._vip_flags.clear()
+            try:
+                inserted = await persistence.write(self._storage.apply_user_batch, new_users, vip_flags)
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote de estatísticas: {e}")
+                # Devolve o lote ao buffer para a próxima tentativa
+                for user in new_users:
+                    self._new_users.setdefault(user['id'], user)
+                for user_id, is_vip in vip_flags.items():
+                    self._vip_flags.setdefault(user_id, is_vip)
+                return 0
+            logger.debug(f"Lote de estatísticas gravado: {inserted} usuários novos, {len(vip_flags)} status VIP")
+            return inserted
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """Inicia o flush periódico (deve ser chamado dentro do loop do bot)"""
+        self.load_known_users()
+        self._storage.set_synchronous('FULL' if self.durability == 'strict' else 'NORMAL')
+        if self.durability == 'strict' or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"Gravação em lote das estatísticas ativa "
+            f"(intervalo {self.flush_interval * 1000:.0f} ms, lote máximo {self.max_batch})"
+        )
+
+    async def close(self):
+        """Para o flush periódico e grava o que estiver pendente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Instância global do buffer de estatísticas
+_user_stats_writer = None
+
+def get_user_stats_writer(config=None):
+    global _user_stats_writer
+    if _user_stats_writer is None:
+        _user_stats_writer = UserStatsWriter.from_config(get_storage(), config)
+    return _user_stats_writer
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 
 from flask import Flask, request, jsonify
-import json
 import os
 from dotenv import load_dotenv
 import logging
 from telegram import Bot
 import asyncio
+from config_service import load_config
+from plan_catalog import get_plan_catalog
 
 app = Flask(__name__)
 load_dotenv()
@@ -18,23 +19,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Carrega a configuração completa
-def load_config():
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            logger.info("Config carregada com sucesso")
-            return config
-    except Exception as e:
-        logger.error(f"Erro ao carregar config.json: {e}")
-        return None
-
 # Carrega apenas os planos VIP
 def load_vip_plans():
-    config = load_config()
-    if config:
-        return config.get('vip_plans', [])
-    return []
+    return list(get_plan_catalog())
 
 # Notifica o admin sobre novo pagamento pendente
 async def notify_admin_pending_payment(order_data):
@@ -108,20 +95,20 @@ def woocommerce_webhook():
         return jsonify({'error': 'Nome do produto não encontrado'}), 400
 
     # Busca o plano VIP correspondente
-    vip_plans = load_vip_plans()
-    matching_plan = next((plan for plan in vip_plans if plan['name'].lower() == product_name.lower()), None)
+    plan_catalog = get_plan_catalog()
+    matching_plan = plan_catalog.find_by_name(product_name)
 
     if not matching_plan:
         return jsonify({
             'error': f'Plano "{product_name}" não encontrado',
-            'available_plans': [plan['name'] for plan in vip_plans]
+            'available_plans': plan_catalog.names()
         }), 404
 
     # Retorna os grupos do plano
     return jsonify({
         'success': True,
         'plan_name': matching_plan['name'],
-        'groups': matching_plan['groups'],
+        'groups': list(matching_plan['groups']),
         'duration_days': matching_plan['duration_days']
     })
 
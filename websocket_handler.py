@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 from flask import Flask, request, jsonify
 from flask_socketio import SocketIO, emit
-import json
 import os
 import logging
 from telegram import Bot
 import asyncio
-from datetime import datetime, timedelta
 import atexit
-from bot import get_bot_instance
+from bot import get_bot_instance, get_bot_loop, on_payment_notification
+from outbound import PRIORITY_NOTICE, priority_kwargs
+from admin_digest import get_admin_digest
+from invite_pool import format_invite_failures, issue_invite_links
+from config_service import load_config
+from plan_catalog import get_plan_catalog
+from payment_notifications import (
+    NotificationError, extract_payment_id, get_notification_deduplicator, verify_signature
+)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
@@ -28,17 +34,19 @@ def get_event_loop():
         asyncio.set_event_loop(event_loop)
     return event_loop
 
-def load_config():
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Erro ao carregar config.json: {e}")
-        return None
+# Tempo máximo de espera por uma chamada feita no loop do bot (segundos)
+BOT_CALL_TIMEOUT = 60
+
+def run_on_bot_loop(coro):
+    """Executa a corrotina no loop do bot, onde os envios passam pela fila de saída"""
+    loop = get_bot_loop()
+    if loop is None or loop.is_closed():
+        # Bot ainda não iniciado: usa o loop local com a instância simples do bot
+        return get_event_loop().run_until_complete(coro)
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=BOT_CALL_TIMEOUT)
 
 def load_vip_plans():
-    config = load_config()
-    return config.get('vip_plans', []) if config else []
+    return list(get_plan_catalog())
 
 async def notify_admin_pending_payment(order_data):
     try:
@@ -58,49 +66,33 @@ async def notify_admin_pending_payment(order_data):
             f"💳 Método: {order_data.get('payment_method_title', 'N/A')}\n"
             f"📝 Status: {order_data.get('status', '').upper()}\n"
         )
-        await bot.send_message(chat_id=config['admin_id'], text=message, parse_mode='Markdown')
+        await bot.send_message(
+            chat_id=config['admin_id'],
+            text=message,
+            parse_mode='Markdown',
+            **priority_kwargs(bot, PRIORITY_NOTICE)
+        )
     except Exception as e:
         logger.error(f"Erro ao notificar admin: {e}")
 
 async def get_group_invite_links(group_ids):
-    """Obtém os links de convite para os grupos especificados"""
+    """Obtém os links de convite para os grupos especificados (um por grupo, sem repetir)"""
     bot = get_bot_instance()
     if not bot:
         logger.error("Não foi possível obter a instância do bot")
-        return [None] * len(group_ids)
-        
-    invite_links = []
-    
-    for group_id in group_ids:
-        try:
-            # Tentar criar um novo link de convite
-            invite_link = await bot.create_chat_invite_link(
-                chat_id=group_id,
-                name=f"VIP {datetime.now().strftime('%Y%m%d')}",
-                expire_date=datetime.now() + timedelta(days=7),
-                member_limit=1,
-                creates_join_request=False
-            )
-            invite_links.append(invite_link.invite_link)
-        except Exception as e:
-            logger.error(f"Erro ao criar link de convite para grupo {group_id}: {e}")
-            try:
-                # Se falhar, tenta obter link existente
-                invite_link = await bot.export_chat_invite_link(chat_id=group_id)
-                invite_links.append(invite_link)
-            except Exception as e2:
-                logger.error(f"Erro ao obter link existente para grupo {group_id}: {e2}")
-                invite_links.append(None)
-    
-    return invite_links
+        return [None] * len(set(map(str, group_ids)))
+
+    links, failures = await issue_invite_links(bot, group_ids)
+    if failures:
+        await get_admin_digest().error(format_invite_failures(failures))
+    return [links.get(group_id) for group_id in dict.fromkeys(map(str, group_ids))]
 
 @app.route('/webhook/woocommerce', methods=['POST'])
 def woocommerce_webhook():
     data = request.json
 
     if data.get('status') == 'pending':
-        loop = get_event_loop()
-        loop.run_until_complete(notify_admin_pending_payment(data))
+        run_on_bot_loop(notify_admin_pending_payment(data))
 
         return jsonify({'message': 'Notificação enviada ao admin'}), 200
 
@@ -110,6 +102,44 @@ def woocommerce_webhook():
 
     return jsonify({'message': 'Status do pedido ignorado'}), 200
 
+@app.route('/webhook/mercadopago', methods=['POST'])
+def mercadopago_webhook():
+    config = load_config()
+    secret = (config or {}).get('mercadopago', {}).get('webhook_secret')
+    if not secret:
+        logger.warning("Notificação do Mercado Pago recebida sem webhook_secret configurado")
+        return jsonify({'error': 'Webhook do Mercado Pago não configurado'}), 503
+
+    body = request.get_json(silent=True) or {}
+    payment_id = extract_payment_id(request.args, body)
+    if not payment_id:
+        return jsonify({'message': 'Notificação ignorada'}), 200
+
+    try:
+        verify_signature(
+            secret,
+            request.headers.get('x-signature'),
+            request.headers.get('x-request-id'),
+            request.args.get('data.id', payment_id)
+        )
+    except NotificationError as e:
+        logger.warning(f"Notificação do Mercado Pago rejeitada: {e}")
+        return jsonify({'error': str(e)}), 401
+
+    # Sem o loop do bot a notificação é recusada para o Mercado Pago reenviar
+    loop = get_bot_loop()
+    if loop is None or loop.is_closed():
+        return jsonify({'error': 'Bot não inicializado'}), 503
+
+    notification_id = body.get('id') or request.headers.get('x-request-id') or f"{payment_id}:{body.get('action')}"
+    if not get_notification_deduplicator().first_seen(str(notification_id)):
+        return jsonify({'message': 'Notificação duplicada'}), 200
+
+    # Entrega o pagamento ao fluxo de liberação no loop do bot
+    loop.call_soon_threadsafe(on_payment_notification, payment_id)
+    logger.info(f"Notificação do pagamento {payment_id} encaminhada ao bot")
+    return jsonify({'message': 'Notificação recebida'}), 200
+
 @socketio.on('order_info')
 def handle_order_info(data):
     order_id = data.get('order_id')
@@ -122,26 +152,22 @@ def handle_order_info(data):
         emit('order_links', {'error': 'Configuração não carregada'})
         return
 
-    vip_plans = config.get('vip_plans', [])
+    plan_catalog = get_plan_catalog(config)
 
     matched_plans = []
     for produto_nome in produtos:
-        for plan in vip_plans:
-            if plan['name'].lower() == produto_nome.lower():
-                matched_plans.append(plan)
-                break
+        plan = plan_catalog.find_by_name(produto_nome)
+        if plan:
+            matched_plans.append(plan)
 
     if not matched_plans:
         emit('order_links', {'error': 'Nenhum plano VIP correspondente encontrado'})
         return
 
-    # Usar o loop de eventos reutilizável
-    loop = get_event_loop()
-
     response = []
     for plan in matched_plans:
         # Obter links de convite para os grupos do plano
-        invite_links = loop.run_until_complete(get_group_invite_links(plan['groups']))
+        invite_links = run_on_bot_loop(get_group_invite_links(plan['groups']))
         
         response.append({
             'plan_id': plan['id'],